@@ -0,0 +1,495 @@
+#!/usr/bin/env python
+"""
+Benchmarks for PyJSDoc, run against synthetic codebases.
+
+Usage: benchmark.py [options] benchmark1 benchmark2 ...
+
+Available benchmarks:
+
+  declarations  Recognize declarations in the code lines after comments
+  functions Convert every function of a function-dense codebase to JSON and HTML
+  memory    Measure the memory held by a loaded codebase, per comment
+  phases    Time each phase of a documentation build separately
+  refs      Render a reference-heavy page in codebases of increasing size
+  templates Render every page with templates compiled once per build, and
+            recompiled per page
+
+Available options:
+
+  -s, --sizes   Comma-separated list of codebase sizes, in files (default: 100,1000,5000)
+  -r, --repeat  Number of times to repeat each timing (default: 3)
+  --comments    Doc comments per file
+  --params      Parameters per function
+  --depth       Depth of the class hierarchies
+  --dag         Shape of the @dependency graph: none, chain, tree or random
+  --fanout      Children per file in a tree, or dependencies per file in a
+                random graph
+  -o, --output  Write the results to this JSON file
+  -b, --baseline  Compare the results against those in this JSON file, and
+                exit with status 1 if any got worse by more than the threshold
+  -t, --threshold  Allowed slowdown over the baseline, in percent (default: 10)
+  --help        Print usage information and exit
+
+Corpus options left unset keep each benchmark's own defaults.
+"""
+
+import os, sys, json, random, shutil, tempfile, getopt, tracemalloc
+from timeit import default_timer as timer
+
+import pyjsdoc
+
+##### Synthetic codebases #####
+
+def file_name(index):
+    """
+    Return the name of synthetic file number `index`, relative to the root.
+    """
+    return 'dir%d/file%d.js' % (index // 100, index)
+
+def dependency_dag(num_files, shape='none', fanout=2, rand=random):
+    """
+    Return a list with the @dependency file numbers of each of `num_files`
+    synthetic files.  Files only depend on lower-numbered ones, so the graph
+    is acyclic.  `shape` is one of:
+
+        - **none**: no dependencies
+        - **chain**: each file depends on the one before it
+        - **tree**: each file depends on its parent in a tree where every
+          file has `fanout` children
+        - **random**: each file depends on up to `fanout` earlier files
+    """
+    if shape == 'none':
+        return [[] for index in range(num_files)]
+    elif shape == 'chain':
+        return [index and [index - 1] or [] for index in range(num_files)]
+    elif shape == 'tree':
+        return [index and [(index - 1) // fanout] or []
+                for index in range(num_files)]
+    elif shape == 'random':
+        return [sorted(set(rand.randrange(index)
+                           for i in range(min(index, fanout))))
+                for index in range(num_files)]
+    raise ValueError('Unknown dependency graph shape: %s' % shape)
+
+def generate_file(index, num_files, comments_per_file=10,
+                  params_per_function=3, refs_per_comment=1,
+                  hierarchy_depth=1, dependencies=(), rand=random):
+    """
+    Return the source text of synthetic file number `index` out of
+    `num_files`.  Each file has a fileoverview block, one class, and
+    `comments_per_file` documented functions and methods, split evenly.
+    Every comment carries `refs_per_comment` @see and {@link} references to
+    classes, functions and methods chosen at random from the whole codebase.
+
+    The classes form inheritance chains `hierarchy_depth` classes long, each
+    extending the class of the previous file; with a depth of 1 or less no
+    class extends another.  The fileoverview block
+    declares the files numbered in `dependencies`.
+    """
+    def random_ref():
+        target = rand.randrange(num_files)
+        which = rand.randrange(3)
+        if which == 0:
+            return 'Class%d' % target
+        elif which == 1:
+            return '#fn_%d_0' % target
+        else:
+            return 'Class%d#method_%d_1' % (target, target)
+
+    def refs():
+        links = [' * See {@link %s} for details.' % random_ref()
+                 for i in range(refs_per_comment // 2)]
+        see_tags = [' * @see %s' % random_ref()
+                    for i in range(refs_per_comment - len(links))]
+        return links + see_tags
+
+    def params(name):
+        return [' * @param {Type%d} arg%d Argument %d of %s.' % (i, i, i, name)
+                for i in range(params_per_function)]
+
+    arg_list = ', '.join('arg%d' % i for i in range(params_per_function))
+    lines = ['/**', ' * Synthetic module %d.' % index, ' *',
+             ' * @fileoverview']
+    lines += [' * @dependency %s' % file_name(dependency)
+              for dependency in dependencies]
+    lines += [' */', '']
+    lines += ['/**', ' * Synthetic class %d.  It does things.' % index]
+    lines += refs() + [' * @class Class%d' % index]
+    if hierarchy_depth > 1 and index % hierarchy_depth:
+        lines += [' * @extends Class%d' % (index - 1)]
+    lines += [' */', 'var Class%d = Class.create({' % index, '']
+    for i in range(1, comments_per_file, 2):
+        name = 'method_%d_%d' % (index, i)
+        lines += ['    /**', '     * Method %s.  It does things.' % name]
+        lines += ['    ' + line for line in refs() + params(name)]
+        lines += ['     * @member Class%d' % index,
+                  '     * @return {Boolean} Whether it worked.', '     */',
+                  '    %s: function(%s) {},' % (name, arg_list), '']
+    lines += ['});', '']
+    for i in range(0, comments_per_file, 2):
+        name = 'fn_%d_%d' % (index, i)
+        lines += ['/**', ' * Function %s.  It does things.' % name]
+        lines += refs() + params(name)
+        lines += [' * @return {String} Some value.', ' */',
+                  'function %s(%s) {' % (name, arg_list), '};', '']
+    return '\n'.join(lines)
+
+def generate_codebase(root, num_files=100, seed=0, dag='none', fanout=2,
+                      **kwargs):
+    """
+    Write a synthetic codebase of `num_files` files into directory `root`,
+    spread over subdirectories of 100 files each.  `dag` and `fanout` give
+    the shape of the dependency graph, as for `dependency_dag`; other
+    keyword arguments are passed on to `generate_file`.  Returns the list of
+    file names, relative to `root`.
+    """
+    rand = random.Random(seed)
+    dependencies = dependency_dag(num_files, dag, fanout, random.Random(seed))
+    names = []
+    for index in range(num_files):
+        name = file_name(index)
+        pyjsdoc.save_file(os.path.join(root, name),
+                generate_file(index, num_files, rand=rand,
+                              dependencies=dependencies[index], **kwargs))
+        names.append(name)
+    return names
+
+def time_call(fn, repeat=1):
+    """
+    Call `fn` `repeat` times, returning the fastest wall time in seconds
+    along with the result of the last call.
+    """
+    best = None
+    for i in range(repeat):
+        start = timer()
+        result = fn()
+        elapsed = timer() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best, result
+
+##### Benchmarks #####
+
+def bench_refs(sizes, repeat, corpus):
+    """
+    Render the same reference-heavy page in codebases of increasing size.
+    The per-reference cost should stay flat as the codebase grows; only the
+    one-time index build scales with the number of files.
+    """
+    results = {}
+    print('%8s %8s %12s %12s %10s' % (
+            'files', 'refs', 'index (ms)', 'page (ms)', 'us/ref'))
+    for size in sizes:
+        root = tempfile.mkdtemp()
+        try:
+            generate_codebase(root, size,
+                              **dict({'refs_per_comment': 6}, **corpus))
+            docs = pyjsdoc.CodeBaseDoc([root])
+            page = docs['dir0/file0.js']
+            num_refs = len(list(page.references()))
+            index_time, _ = time_call(lambda: docs._ref_index())
+            page_time, _ = time_call(lambda: page.to_html(docs), repeat)
+            print('%8d %8d %12.2f %12.2f %10.2f' % (size, num_refs,
+                    index_time * 1000, page_time * 1000,
+                    page_time * 1e6 / max(num_refs, 1)))
+            results[str(size)] = {'index': index_time, 'page': page_time}
+        finally:
+            shutil.rmtree(root)
+    return results
+
+MODERN_LINES = [
+    'const render = (props) => {',
+    'export class Widget extends Base {',
+    '    async fetchAll(urls, options) {',
+    'function* items(limit) {',
+    'let handler = async function(event) {',
+]
+
+def bench_declarations(sizes, repeat, corpus):
+    """
+    Recognize the declarations in the code lines following every comment of
+    a codebase, mixed with some modern syntax, once with the old chain of
+    uncompiled FUNCTION_REGEXPS and once with the DECLARATIONS recognizer,
+    which knows more patterns.  Also times parsing the whole codebase.
+    """
+    results = {}
+    print('%8s %10s %14s %16s %12s' % (
+            'files', 'lines', 'chain (ms)', 'recognizer (ms)', 'parse (ms)'))
+    for size in sizes:
+        root = tempfile.mkdtemp()
+        try:
+            generate_codebase(root, size, **corpus)
+            texts = [pyjsdoc.read_file(file)
+                     for file in pyjsdoc.get_file_list([root])]
+            lines = [next_line for text in texts for comment, next_line
+                     in pyjsdoc.get_doc_comments(text)]
+            lines += MODERN_LINES * (len(lines) // 10)
+            chain_time, _ = time_call(lambda: [
+                    pyjsdoc.guess_function_name(line, pyjsdoc.FUNCTION_REGEXPS)
+                    for line in lines], repeat)
+            recognizer_time, _ = time_call(lambda: [
+                    pyjsdoc.guess_declaration(line) for line in lines], repeat)
+            parse_time, _ = time_call(lambda: [
+                    pyjsdoc.parse_file_comments(text) for text in texts],
+                    repeat)
+            print('%8d %10d %14.2f %16.2f %12.2f' % (size, len(lines),
+                    chain_time * 1000, recognizer_time * 1000,
+                    parse_time * 1000))
+            results[str(size)] = {'chain': chain_time,
+                    'recognizer': recognizer_time, 'parse': parse_time}
+        finally:
+            shutil.rmtree(root)
+    return results
+
+def bench_functions(sizes, repeat, corpus):
+    """
+    Convert every function and method of a function-dense codebase with
+    many parameters to a dict and to HTML, as a -j run followed by an HTML
+    build would.  The first pass parses the @param tags; later passes
+    should reuse them.
+    """
+    results = {}
+    print('%8s %10s %14s %14s' % (
+            'files', 'functions', 'first (ms)', 'again (ms)'))
+    for size in sizes:
+        root = tempfile.mkdtemp()
+        try:
+            generate_codebase(root, size, **dict({'comments_per_file': 40,
+                    'params_per_function': 8, 'refs_per_comment': 0},
+                    **corpus))
+            docs = pyjsdoc.CodeBaseDoc([root])
+            functions = list(docs.all_functions.values()) + \
+                        list(docs.all_methods.values())
+            def convert():
+                for fn in functions:
+                    fn.to_dict()
+                    fn.to_html(docs)
+            first_time, _ = time_call(convert)
+            again_time, _ = time_call(convert, repeat)
+            print('%8d %10d %14.2f %14.2f' % (size, len(functions),
+                    first_time * 1000, again_time * 1000))
+            results[str(size)] = {'first': first_time, 'again': again_time}
+        finally:
+            shutil.rmtree(root)
+    return results
+
+def traced_memory(fn):
+    """
+    Call `fn` with tracemalloc running, returning the number of bytes
+    allocated by the call that are still alive afterwards, along with its
+    result.
+    """
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        result = fn()
+        return tracemalloc.get_traced_memory()[0] - before, result
+    finally:
+        tracemalloc.stop()
+
+def bench_memory(sizes, repeat, corpus):
+    """
+    Measure the memory held by a fully loaded `CodeBaseDoc`, next to what
+    the plain parsed-comment dictionaries for the same files take up.
+    Results are in bytes rather than seconds.
+    """
+    results = {}
+    print('%8s %10s %14s %14s %10s' % (
+            'files', 'comments', 'parsed (MB)', 'codebase (MB)', 'B/comment'))
+    for size in sizes:
+        root = tempfile.mkdtemp()
+        try:
+            generate_codebase(root, size, **corpus)
+            files = pyjsdoc.get_file_list([root])
+            parsed_bytes, parsed = traced_memory(lambda: [
+                    pyjsdoc.parse_comments_for_file(file) for file in files])
+            num_comments = sum(len(comments) for comments in parsed)
+            del parsed
+            codebase_bytes, docs = traced_memory(
+                    lambda: pyjsdoc.CodeBaseDoc([root]))
+            print('%8d %10d %14.2f %14.2f %10d' % (size, num_comments,
+                    parsed_bytes / 1e6, codebase_bytes / 1e6,
+                    codebase_bytes // max(num_comments, 1)))
+            results[str(size)] = {'parsed_bytes': parsed_bytes,
+                                  'codebase_bytes': codebase_bytes}
+        finally:
+            shutil.rmtree(root)
+    return results
+
+PHASES = ['walk', 'read', 'parse', 'build_dependencies',
+          'build_superclass_lists', 'to_html', 'to_json', 'save_docs']
+
+def bench_phases(sizes, repeat, corpus):
+    """
+    Time each phase of a full documentation build on its own: finding the
+    files, reading them, parsing them into `FileDoc`s, dependency and
+    superclass analysis, rendering every page to HTML, converting the whole
+    codebase to JSON, and `save_docs` into an empty directory.
+    """
+    results = {}
+    # Import what save_docs loads its static files with up front, so the
+    # first size isn't charged for it.
+    pyjsdoc.load_static_file('jsdoc.css')
+    print('%8s ' % 'files' + ' '.join('%10s' % phase[:10] for phase in PHASES))
+    for size in sizes:
+        root = tempfile.mkdtemp()
+        output_dir = tempfile.mkdtemp()
+        try:
+            generate_codebase(root, size, **dict({'hierarchy_depth': 4,
+                    'dag': 'tree'}, **corpus))
+            times = {}
+            times['walk'], files = time_call(
+                    lambda: pyjsdoc.get_file_list([root]), repeat)
+            times['read'], texts = time_call(
+                    lambda: [pyjsdoc.read_file(file) for file in files],
+                    repeat)
+            times['parse'], _ = time_call(
+                    lambda: [pyjsdoc.FileDoc(file, text)
+                             for file, text in zip(files, texts)], repeat)
+            docs = pyjsdoc.CodeBaseDoc([root])
+            times['build_dependencies'], _ = time_call(
+                    docs._build_dependencies, repeat)
+            times['build_superclass_lists'], _ = time_call(
+                    docs._build_superclass_lists, repeat)
+            times['to_html'], _ = time_call(lambda: [
+                    file_doc.to_html(docs) for file_doc in docs.values()],
+                    repeat)
+            times['to_json'], _ = time_call(docs.to_json, repeat)
+            def save_docs():
+                shutil.rmtree(output_dir)
+                docs.save_docs(output_dir=output_dir)
+            times['save_docs'], _ = time_call(save_docs, repeat)
+            print('%8d ' % size + ' '.join('%10.1f' % (times[phase] * 1000)
+                                          for phase in PHASES))
+            results[str(size)] = times
+        finally:
+            shutil.rmtree(root)
+            shutil.rmtree(output_dir, True)
+    return results
+
+def bench_templates(sizes, repeat, corpus):
+    """
+    Time compiling the default `TemplateSet`, then rendering every page of a
+    codebase to HTML with the build's templates, compiled once, and with a
+    freshly compiled set for each page.  Compare `to_html` against the
+    `phases` results of older versions with --baseline.
+    """
+    results = {}
+    print('%8s %14s %14s %16s' % (
+            'files', 'compile (ms)', 'to_html (ms)', 'uncached (ms)'))
+    for size in sizes:
+        root = tempfile.mkdtemp()
+        try:
+            generate_codebase(root, size, **dict({'hierarchy_depth': 4,
+                    'dag': 'tree'}, **corpus))
+            docs = pyjsdoc.CodeBaseDoc([root])
+            compile_time, templates = time_call(pyjsdoc.TemplateSet, repeat)
+            render_time, _ = time_call(lambda: [
+                    file_doc.to_html(docs) for file_doc in docs.values()],
+                    repeat)
+            def render_uncached():
+                for file_doc in docs.values():
+                    docs.templates = pyjsdoc.TemplateSet()
+                    file_doc.to_html(docs)
+            uncached_time, _ = time_call(render_uncached, repeat)
+            docs.templates = templates
+            print('%8d %14.2f %14.2f %16.2f' % (size, compile_time * 1000,
+                    render_time * 1000, uncached_time * 1000))
+            results[str(size)] = {'compile': compile_time,
+                    'to_html': render_time, 'uncached': uncached_time}
+        finally:
+            shutil.rmtree(root)
+    return results
+
+BENCHMARKS = {
+    'declarations': bench_declarations,
+    'functions': bench_functions,
+    'memory': bench_memory,
+    'phases': bench_phases,
+    'refs': bench_refs,
+    'templates': bench_templates,
+}
+
+def find_regressions(results, baseline, threshold):
+    """
+    Compare `results` to `baseline`, both as written by --output, and
+    return a list of (benchmark, size, metric, baseline value, new value)
+    for every measurement that grew by more than `threshold` (a fraction).
+    Measurements missing from either are skipped, and any growth from a
+    baseline of zero counts.
+
+    >>> find_regressions({'refs': {'100': {'page': 1.2, 'index': 1.0}}},
+    ...                  {'refs': {'100': {'page': 1.0, 'index': 1.0}}}, 0.1)
+    [('refs', '100', 'page', 1.0, 1.2)]
+    >>> find_regressions({'memory': {'100': {'kb': 4, 'peak': 0}}},
+    ...                  {'memory': {'100': {'kb': 0, 'peak': 0}}}, 0.1)
+    [('memory', '100', 'kb', 0, 4)]
+
+    """
+    regressions = []
+    for name in sorted(results):
+        for size in sorted(results[name], key=int):
+            for metric in sorted(results[name][size]):
+                try:
+                    old = baseline[name][size][metric]
+                except KeyError:
+                    continue
+                new = results[name][size][metric]
+                if new > old * (1 + threshold):
+                    regressions.append((name, size, metric, old, new))
+    return regressions
+
+CORPUS_OPTIONS = [
+    ('--comments', 'comments_per_file', int),
+    ('--params', 'params_per_function', int),
+    ('--depth', 'hierarchy_depth', int),
+    ('--dag', 'dag', str),
+    ('--fanout', 'fanout', int),
+]
+
+def main(args=sys.argv):
+    try:
+        opts, args = getopt.gnu_getopt(args[1:], 's:r:o:b:t:',
+                ['sizes=', 'repeat=', 'comments=', 'params=', 'depth=',
+                 'dag=', 'fanout=', 'output=', 'baseline=', 'threshold=',
+                 'help'])
+        opts = dict(opts)
+    except getopt.GetoptError:
+        print(__doc__)
+        sys.exit(2)
+    if '--help' in opts:
+        print(__doc__)
+        sys.exit(0)
+
+    sizes = [int(size) for size in
+             (opts.get('--sizes') or opts.get('-s') or '100,1000,5000').split(',')]
+    repeat = int(opts.get('--repeat') or opts.get('-r') or 3)
+    corpus = dict((key, convert(opts[opt])) for opt, key, convert
+                  in CORPUS_OPTIONS if opt in opts)
+    results = {}
+    for name in args or sorted(BENCHMARKS):
+        print('== %s ==' % name)
+        results[name] = BENCHMARKS[name](sizes, repeat, corpus)
+
+    output = opts.get('--output') or opts.get('-o')
+    if output:
+        pyjsdoc.save_file(output, json.dumps(results, indent=2, sort_keys=True))
+
+    baseline = opts.get('--baseline') or opts.get('-b')
+    if baseline:
+        threshold = float(opts.get('--threshold') or opts.get('-t') or 10)
+        regressions = find_regressions(results,
+                json.loads(pyjsdoc.read_file(baseline)), threshold / 100)
+        for name, size, metric, old, new in regressions:
+            if old:
+                change = '%+.0f%%' % ((new / old - 1) * 100)
+            else:
+                change = 'from zero'
+            print('REGRESSION %s %s files %s: %.4g -> %.4g (%s)' % (
+                    name, size, metric, old, new, change))
+        if regressions:
+            sys.exit(1)
+        print('No regressions over %s%% against %s' % (threshold, baseline))
+
+if __name__ == '__main__':
+    main()
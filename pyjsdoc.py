@@ -38,19 +38,34 @@ Tag reference is similar to JSDoc: http://jsdoc.sourceforge.net/#tagref.  See us
 
 """
 
-import os, re, sys, getopt, cgi
+import os, re, io, sys, time, keyword, getopt, cgi, hashlib, pickle, tempfile, shutil
+
+try:
+    intern = sys.intern
+except AttributeError:
+    pass    # Python 2 has it as a builtin
 
 try:
     import cjson
     encode_json = lambda val: cjson.encode(val)
+    decode_json = lambda text: cjson.decode(text)
 except ImportError:
     try:
         import simplejson
         encode_json = lambda val: simplejson.dumps(val)
+        decode_json = lambda text: simplejson.loads(text)
     except ImportError:
-        def encode_json(val):
-            raise ImportError(
-                    "Either cjson or simplejson is required for JSON encoding")
+        try:
+            import json
+            encode_json = lambda val: json.dumps(val)
+            decode_json = lambda text: json.loads(text)
+        except ImportError:
+            def encode_json(val):
+                raise ImportError("Either cjson, simplejson or json is "
+                                  "required for JSON encoding")
+            def decode_json(text):
+                raise ImportError("Either cjson, simplejson or json is "
+                                  "required for JSON decoding")
 
 ##### INPUT/OUTPUT #####
 
@@ -143,15 +158,26 @@ def read_file(path):
     finally:
         fd.close()
 
+def content_hash(text):
+    """
+    Return a hex digest identifying the contents of a string.
+
+    >>> content_hash('var x;') == content_hash('var x;')
+    True
+    >>> content_hash('var x;') == content_hash('var y;')
+    False
+
+    """
+    if not isinstance(text, bytes):
+        text = text.encode('utf-8')
+    return hashlib.sha1(text).hexdigest()
+
 def save_file(path, text):
     """
     Save a string to a file.  If the containing directory(ies) doesn't exist,
     this creates it.
     """
-    dir = os.path.dirname(path)
-    if not os.path.exists(dir):
-        os.makedirs(dir)
-
+    make_parent_dirs(path)
     fd = open(path, 'wb')
     try:
         if type(text) == str:
@@ -160,6 +186,100 @@ def save_file(path, text):
     finally:
         fd.close()
 
+def make_parent_dirs(path):
+    """
+    Create the directory(ies) containing `path` if they don't exist.
+    """
+    dir = os.path.dirname(path)
+    if dir and not os.path.exists(dir):
+        os.makedirs(dir)
+
+OUTPUT_BUFFER_SIZE = 256 * 1024
+"""
+Buffer size for files opened with `open_output_file`.
+"""
+
+def open_output_file(path):
+    """
+    Open `path` for writing text through a buffered writer, creating the
+    containing directory(ies) if needed.  Text is encoded as UTF-8 and
+    newlines are written as given, so writing a string in fragments gives
+    the same file as `save_file`.
+    """
+    make_parent_dirs(path)
+    return io.open(path, 'w', encoding='utf-8', newline='',
+                   buffering=OUTPUT_BUFFER_SIZE)
+
+def save_file_if_changed(path, text):
+    """
+    Save a string to a file with `save_file`, unless the file already has
+    exactly that content, in which case it's left untouched (keeping its
+    modification time).  Returns True if the file was written.
+    """
+    if type(text) == str:
+        text = text.encode('utf-8')
+    try:
+        fd = open(path, 'rb')
+        try:
+            if fd.read() == text:
+                return False
+        finally:
+            fd.close()
+    except IOError:
+        pass
+    save_file(path, text)
+    return True
+
+COPY_BUFFER_SIZE = 1024 * 1024
+"""
+Buffer size for `append_file` when it can't copy within the kernel.
+"""
+
+def _zero_copy_functions():
+    """
+    Return the available ways of copying `count` bytes between two file
+    descriptors without going through user space, best first.  Each takes
+    (source, destination, count), uses and advances both file positions, and
+    returns the number of bytes copied.
+    """
+    functions = []
+    if hasattr(os, 'copy_file_range'):
+        functions.append(lambda source, destination, count:
+                         os.copy_file_range(source, destination, count))
+    if hasattr(os, 'sendfile'):
+        functions.append(lambda source, destination, count:
+                         os.sendfile(destination, source, None, count))
+    return functions
+
+def append_file(destination, path):
+    """
+    Append the contents of the file at `path` to `destination`, an
+    unbuffered binary file object, and return the number of bytes copied.
+    Where the platform allows, the data is copied within the kernel
+    (with copy_file_range or sendfile); otherwise, or if that fails, it's
+    copied through a large buffer.
+    """
+    start = destination.tell()
+    source = open(path, 'rb', 0)
+    try:
+        remaining = os.fstat(source.fileno()).st_size
+        for copy in _zero_copy_functions():
+            try:
+                while remaining > 0:
+                    copied = copy(source.fileno(), destination.fileno(),
+                                  min(remaining, 1 << 30))
+                    if not copied:
+                        break
+                    remaining -= copied
+                break
+            except OSError:
+                continue
+        # Picks up anything not copied above, or appended in the meantime.
+        shutil.copyfileobj(source, destination, COPY_BUFFER_SIZE)
+    finally:
+        source.close()
+    return destination.tell() - start
+
 ##### Parsing utilities #####
 
 def split_delimited(delimiters, split_by, text):
@@ -217,6 +337,71 @@ def split_delimited(delimiters, split_by, text):
             pass # Normal character
     yield text[last:]
 
+PAREN_OR_NEWLINE = re.compile(r'[()\n]')
+
+def scan_doc_comments(text):
+    r"""
+    Scan `text` for documentation comments in a single forward pass.  Returns
+    a list of (comment_start, comment_end, line_start, line_end) character
+    offsets, one for each comment: ``text[comment_start:comment_end]`` is the
+    comment itself and ``text[line_start:line_end]`` is the code line after
+    it, extended over newlines until its parentheses balance.
+
+    >>> scan_doc_comments('/** A. */\nfunction a(x,\n  y) {}\n/** B. */\nvar b;\n')
+    [(0, 9, 10, 31), (32, 41, 42, 48)]
+
+    """
+    comments = []
+    queries = []
+    pos = 0
+    while True:
+        start = text.find('/**', pos)
+        if start == -1:
+            break
+        end = text.find('*/', start + 3)
+        if end == -1:
+            break
+        end += 2
+        line_start = text.find('\n', end) + 1
+        if text.find('@class', start, end) == -1:
+            line_end = len(text)
+            queries.append((line_start, len(comments)))
+        else:
+            line_end = text.find('\n', line_start)
+            if line_end == -1:
+                line_end = len(text) - 1
+        comments.append([start, end, line_start, line_end])
+        pos = end
+
+    # Each query is resolved by the first newline after it at the same paren
+    # depth.  Queries still pending are grouped by depth; when none are
+    # pending, the depth count is irrelevant, so skip ahead to the next one.
+    queries.sort()
+    pending = {}
+    depth = 0
+    pos = 0
+    i = 0
+    while i < len(queries) or pending:
+        if not pending:
+            pos = queries[i][0]
+        match = PAREN_OR_NEWLINE.search(text, pos)
+        if match is None:
+            break
+        pos = match.start()
+        while i < len(queries) and queries[i][0] <= pos:
+            pending.setdefault(depth, []).append(queries[i][1])
+            i += 1
+        char = text[pos]
+        if char == '\n':
+            for index in pending.pop(depth, ()):
+                comments[index][3] = pos
+        elif char == '(':
+            depth += 1
+        else:
+            depth -= 1
+        pos += 1
+    return [tuple(comment) for comment in comments]
+
 def get_doc_comments(text):
     r"""
     Return a list of all documentation comments in the file text.  Each
@@ -234,19 +419,14 @@ def get_doc_comments(text):
     '/** This is the documentation for the second function. */'
 
     """
-    def make_pair(match):
-        comment = match.group()
-        try:
-            end = text.find('\n', match.end(0)) + 1
-            if '@class' not in comment:
-                next_line = next(split_delimited('()', '\n', text[end:]))
-            else:
-                next_line = text[end:text.find('\n', end)]
-        except StopIteration:
-            next_line = ''
-        return (comment, next_line)
-    return [make_pair(match) for match in re.finditer('/\*\*(.*?)\*/', 
-            text, re.DOTALL)]
+    return [(text[comment_start:comment_end], text[line_start:line_end])
+            for comment_start, comment_end, line_start, line_end
+            in scan_doc_comments(text)]
+
+STAR_REGEXP = re.compile(r'\n\s*?\*\s*?')
+WHITESPACE_REGEXP = re.compile(r'\s+')
+TAG_REGEXP = re.compile(r'\n\s*@')
+PARAMETERS_REGEXP = re.compile(r'\(([\w\s,]+)\)')
 
 def strip_stars(doc_comment):
     r"""
@@ -260,30 +440,149 @@ def strip_stars(doc_comment):
     'This is a\n multiline comment.'
 
     """
-    return re.sub('\n\s*?\*\s*?', '\n', doc_comment[3:-2]).strip()
+    return STAR_REGEXP.sub('\n', doc_comment[3:-2]).strip()
 
 def split_tag(section):
     """
     Split the JSDoc tag text (everything following the @) at the first
     whitespace.  Returns a tuple of (tagname, body).
     """
-    splitval = re.split('\s+', section, 1)
+    splitval = WHITESPACE_REGEXP.split(section, 1)
     tag, body = len(splitval) > 1 and splitval or (splitval[0], '')
     return tag.strip(), body.strip()
 
+LINK_REGEXP = re.compile(r'{@link ([\w#]+)}')
+
 FUNCTION_REGEXPS = [
-    'function (\w+)',
-    '(\w+):\sfunction',
-    '\.(\w+)\s*=\s*function',
+    r'function (\w+)',
+    r'(\w+):\sfunction',
+    r'\.(\w+)\s*=\s*function',
 ]
 
-def guess_function_name(next_line, regexps=FUNCTION_REGEXPS):
+FUNCTION_PATTERNS = [re.compile(regexp) for regexp in FUNCTION_REGEXPS]
+
+class DeclarationRecognizer(object):
+    r"""
+    Recognizes what the code line after a doc comment declares, from an
+    ordered list of (kind, pattern) pairs.  The kind is 'function' or
+    'class', and the first group of the pattern captures the declared name.
+    As with `re.search`, a pattern can match anywhere in the line; if several
+    do, the one registered first wins.
+
+    >>> recognizer = DeclarationRecognizer([('function', r'function (\w+)'),
+    ...                                     ('class', r'class (\w+)')])
+    >>> recognizer.match('class Widget { render() { function helper() {} } }')
+    ('function', 'helper')
+    >>> recognizer.match('var x = 1;')
+    (None, None)
+
+    Patterns are compiled once, when they're registered.
+    """
+
+    def __init__(self, declarations=()):
+        self.declarations = []
+        for kind, pattern in declarations:
+            self.register(kind, pattern)
+
+    def register(self, kind, pattern, first=False):
+        r"""
+        Add a recognizer for declarations of `kind` that match `pattern`,
+        after the existing ones, or before them if `first` is True.
+
+        >>> recognizer = DeclarationRecognizer()
+        >>> recognizer.register('function', r'def (\w+)')
+        >>> recognizer.match('def spam(eggs):')
+        ('function', 'spam')
+
+        """
+        compiled = re.compile(pattern)
+        if compiled.groups < 1:
+            raise ValueError('Declaration pattern %r has no group for the '
+                             'name' % pattern)
+        if first:
+            self.declarations.insert(0, (kind, compiled))
+        else:
+            self.declarations.append((kind, compiled))
+
+    def match(self, next_line):
+        """
+        Return a (kind, name) pair for the declaration in `next_line`, or
+        (None, None) if there isn't one.
+        """
+        kind, name, pattern = self.search(next_line)
+        return kind, name
+
+    def search(self, next_line):
+        """
+        Like `match`, but return a (kind, name, compiled pattern) triple,
+        or (None, None, None).
+        """
+        for kind, compiled in self.declarations:
+            match = compiled.search(next_line)
+            if match:
+                return kind, match.group(1), compiled
+        return None, None, None
+
+DECLARATIONS = DeclarationRecognizer(
+    [('function', pattern) for pattern in FUNCTION_PATTERNS] + [
+    ('function', r'function\s*\*\s*(\w+)'),
+    ('function', r'\b(?:var|let|const)\s+(\w+)\s*=\s*(?:async\s+)?'
+                 r'(?:function\b|(?:\([^()]*\)|\w+)\s*=>)'),
+    ('function', r'^\s*(?:(?:static|async|get|set)\s+)*\*?\s*'
+                 r'(?!(?:if|for|while|switch|catch|with|function|return)\b)'
+                 r'(\w+)\s*\([^()]*\)\s*{'),
+    ('class', r'^\s*(?:export\s+(?:default\s+)?)?class\s+(\w+)'),
+])
+"""
+The `DeclarationRecognizer` used by `parse_comment`.  Besides the classic
+`FUNCTION_REGEXPS`, it knows generator functions, functions and arrow
+functions assigned to variables, shorthand and class methods, and class
+declarations.  Only the classic patterns give a 'guessed_function'; the
+others give a 'recognized_function' or 'recognized_class', which only
+count for comments that would otherwise be ignored (see
+`classify_comment`).
+"""
+
+def register_declaration(kind, pattern, first=False):
+    r"""
+    Teach `parse_comment` a new kind of declaration: code lines matching
+    `pattern` declare a 'function' or 'class' (per `kind`) named by the first
+    group of the pattern.  New patterns are tried after the built-in ones,
+    unless `first` is True.
+    """
+    DECLARATIONS.register(kind, pattern, first)
+
+def guess_declaration(next_line):
+    r"""
+    Attempt to determine what the first code line following a comment
+    declares, as a (kind, name) pair, or (None, None) if it's not
+    recognized.
+
+    >>> guess_declaration('function make_class(name) {')
+    ('function', 'make_class')
+    >>> guess_declaration('const render = async (props) => {')
+    ('function', 'render')
+    >>> guess_declaration('  *items(limit) {')
+    ('function', 'items')
+    >>> guess_declaration('export class Widget extends Base {')
+    ('class', 'Widget')
+    >>> guess_declaration('if (ready) {')
+    (None, None)
+
+    """
+    return DECLARATIONS.match(next_line)
+
+def guess_function_name(next_line, regexps=None):
     """
     Attempt to determine the function name from the first code line
-    following the comment.  The patterns recognized are described by
-    `regexps`, which defaults to FUNCTION_REGEXPS.  If a match is successful, 
-    returns the function name.  Otherwise, returns None.
+    following the comment.  If `regexps` is given, its patterns are tried in
+    turn; otherwise the line is matched against `DECLARATIONS`.  If a
+    function declaration is found, returns the function name.  Otherwise,
+    returns None.
     """
+    if regexps is None:
+        kind, name = DECLARATIONS.match(next_line)
+        return kind == 'function' and name or None
     for regexp in regexps:
         match = re.search(regexp, next_line)
         if match:
@@ -296,7 +595,7 @@ def guess_parameters(next_line):
     group of identifiers.  If successful, returns a list of parameter names;
     otherwise, returns None.
     """
-    match = re.search('\(([\w\s,]+)\)', next_line)
+    match = PARAMETERS_REGEXP.search(next_line)
     if match:
         return [arg.strip() for arg in match.group(1).split(',')]
     else:
@@ -319,12 +618,16 @@ def parse_comment(doc_comment, next_line):
     ['{String} arg1 The first argument.', '{Int} arg2 The second argument.']
 
     """
-    sections = re.split('\n\s*@', doc_comment)
+    sections = TAG_REGEXP.split(doc_comment)
+    kind, name, pattern = DECLARATIONS.search(next_line)
+    classic = pattern in FUNCTION_PATTERNS
     tags = { 
         'doc': sections[0].strip(),
-        'guessed_function': guess_function_name(next_line),
+        'guessed_function': classic and name or None,
         'guessed_params': guess_parameters(next_line)
     }
+    if kind and not classic:
+        tags['recognized_' + kind] = name
     for section in sections[1:]:
         tag, body = split_tag(section)
         if tag in tags:
@@ -337,17 +640,313 @@ def parse_comment(doc_comment, next_line):
             tags[tag] = body
     return tags
 
+def classify_comment(raw, is_first):
+    r"""
+    Decide what a parsed comment documents: 'module', 'function', 'class',
+    or None if it's to be ignored.  `is_first` says whether it's the first
+    comment of its file.  A @fileoverview comment is the module's; then a
+    @function tag or a function found by the classic `FUNCTION_REGEXPS`
+    make a function, a @class tag a class, and the first comment of the
+    file is the module's.  Declarations found by the other `DECLARATIONS`
+    patterns only count for comments that none of those apply to:
+
+    >>> classify_comment(parse_comment('Renders.',
+    ...                                'const render = (props) => {'), False)
+    'function'
+    >>> classify_comment(parse_comment('A class.\n@class Foo',
+    ...                                'var Foo = function(a, b) {'), False)
+    'class'
+
+    Class declarations are only recognized at the start of a statement:
+
+    >>> classify_comment(parse_comment('Resize.',
+    ...         "el.setAttribute('class', 'class big');"), False)
+
+    """
+    if 'fileoverview' in raw:
+        return 'module'
+    elif raw.get('function') or raw.get('guessed_function'):
+        return 'function'
+    elif raw.get('class'):
+        return 'class'
+    elif is_first:
+        return 'module'
+    elif raw.get('recognized_function'):
+        return 'function'
+    elif raw.get('recognized_class'):
+        return 'class'
+    return None
+
+def parse_file_comments(file_text):
+    """
+    Return a list of all parsed comments in the file text, as dictionaries
+    from `parse_comment`.
+    """
+    return [parse_comment(strip_stars(comment), next_line)
+            for comment, next_line in get_doc_comments(file_text)]
+
 def parse_comments_for_file(filename):
     """
     Return a list of all parsed comments in a file.  Mostly for testing &
     interactive use.
     """
-    return [parse_comment(strip_stars(comment), next_line)
-            for comment, next_line in get_doc_comments(read_file(filename))]
+    return parse_file_comments(read_file(filename))
+
+def read_module_comment(path, chunk_size=4096):
+    """
+    Return the parsed module documentation of the JS file at `path`, as a
+    dictionary from `parse_comment`, or None if the file has none.  This is
+    all that dependency analysis needs, so it avoids reading and parsing the
+    rest of the file where it can.
+
+    The file is read `chunk_size` characters at a time, doubling each time,
+    until its first doc comment is complete.  If that has a @fileoverview
+    tag, it's returned right away, without reading on to guess a function
+    name from the code after it:
+
+    >>> read_module_comment('examples/module_closure.js', 16)['dependency']
+    'module.js'
+
+    Otherwise the whole file is parsed, and the result is the same as the
+    `ModuleDoc` of a `FileDoc`: the last @fileoverview comment, or else the
+    first comment if it doesn't document a function or class.
+
+    >>> read_module_comment('examples/subclass.js')['dependency']
+    ['module_closure.js', 'class.js']
+    >>> read_module_comment('examples/class.js') is None
+    True
+
+    Unlike `FileDoc`, a @fileoverview block in the first comment wins over
+    any later ones.
+    """
+    fd = open(path)
+    try:
+        text = ''
+        while True:
+            chunk = fd.read(chunk_size)
+            text += chunk
+            chunk_size *= 2
+            start = text.find('/**')
+            end = text.find('*/', start + 3)
+            if start != -1 and end != -1:
+                break
+            if not chunk:
+                return None
+        raw = parse_comment(strip_stars(text[start:end + 2]), '')
+        if 'fileoverview' in raw:
+            return raw
+        text += fd.read()
+    finally:
+        fd.close()
+
+    comments = get_doc_comments(text)
+    for comment, next_line in reversed(comments):
+        if '@fileoverview' in comment:
+            raw = parse_comment(strip_stars(comment), next_line)
+            if 'fileoverview' in raw:
+                return raw
+    raw = parse_comment(strip_stars(comments[0][0]), comments[0][1])
+    if classify_comment(raw, True) != 'module':
+        return None
+    return raw
+
+##### Parse cache #####
+
+PARSE_CACHE_VERSION = 4
+"""
+Version of the parser output stored by `ParseCache`.  Bump this whenever
+`parse_file_comments` changes what it returns, so stale entries are ignored.
+"""
+
+class ParseCache(object):
+    """
+    An on-disk cache of parsed doc comments, so that unchanged files don't
+    need to be re-read and re-parsed on every run.
+
+    Each source file gets one entry in `cache_dir`, recording the path, size,
+    modification time and content hash of the text it was parsed from.  An
+    entry is used as-is if the size and modification time still match, or
+    failing that if the file's content hash does.  Entries written for a
+    different `PARSE_CACHE_VERSION` are ignored.
+
+    `hits` and `misses` count lookups since the cache was created.
+
+    >>> cache = ParseCache(tempfile.mkdtemp())
+    >>> cache.parse_file('examples/class.js')[0]['class']
+    'MyClass'
+    >>> cache.parse_file('examples/class.js')[0]['class']
+    'MyClass'
+    >>> cache.stats()
+    {'hits': 1, 'misses': 1}
+    >>> shutil.rmtree(cache.cache_dir)
+
+    """
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        self.hits = 0
+        self.misses = 0
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+
+    def _entry_path(self, path):
+        return os.path.join(self.cache_dir, content_hash(path) + '.pickle')
+
+    def _read_entry(self, path):
+        try:
+            fd = open(self._entry_path(path), 'rb')
+            try:
+                entry = pickle.load(fd)
+            finally:
+                fd.close()
+        except Exception:
+            # Missing, truncated, or written by an incompatible Python.
+            return None
+        if not isinstance(entry, dict) or \
+                entry.get('version') != PARSE_CACHE_VERSION or \
+                entry.get('path') != path:
+            return None
+        return entry
+
+    def _write_entry(self, path, entry):
+        fd, temp_path = tempfile.mkstemp(dir=self.cache_dir)
+        try:
+            fd = os.fdopen(fd, 'wb')
+            try:
+                pickle.dump(entry, fd, pickle.HIGHEST_PROTOCOL)
+            finally:
+                fd.close()
+            os.replace(temp_path, self._entry_path(path))
+        except (IOError, OSError):
+            warn('Could not write parse cache entry for %s', path)
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+
+    def parse_file(self, path):
+        """
+        Return the parsed comments of the file at `path`, as per
+        `parse_file_comments`, using the cached copy if the file hasn't
+        changed.
+        """
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        mtime = getattr(stat, 'st_mtime_ns', stat.st_mtime)
+        entry = self._read_entry(path)
+        if entry and entry['size'] == stat.st_size and entry['mtime'] == mtime:
+            self.hits += 1
+            return entry['comments']
+
+        text = read_file(path)
+        digest = content_hash(text)
+        if entry and entry['hash'] == digest:
+            self.hits += 1
+        else:
+            self.misses += 1
+            entry = {
+                'version': PARSE_CACHE_VERSION,
+                'path': path,
+                'hash': digest,
+                'comments': parse_file_comments(text)
+            }
+        entry['size'] = stat.st_size
+        entry['mtime'] = mtime
+        self._write_entry(path, entry)
+        return entry['comments']
+
+    def stats(self):
+        """
+        Return hit & miss counts as a dictionary.
+        """
+        return {'hits': self.hits, 'misses': self.misses}
+
+def _parse_file_job(job):
+    """
+    Worker for parallel parsing in `CodeBaseDoc`.  `job` is a (path,
+    cache_dir) pair; returns the parsed comments of the file, along with
+    whether they came from the parse cache (None if there's no cache).
+    """
+    path, cache_dir = job
+    if cache_dir is None:
+        return parse_file_comments(read_file(path)), None
+    cache = ParseCache(cache_dir)
+    comments = cache.parse_file(path)
+    return comments, cache.hits > 0
 
 
 #### Classes #####
 
+class BuildTimings(object):
+    """
+    Collects timings for the phases of loading a codebase and building its
+    documentation.  Pass one as `timings` to `CodeBaseDoc`, which calls
+    `record` when each phase (or each file within a phase) finishes, and
+    `count` for events like reference lookups.  Subclasses can override
+    those two methods to send the measurements elsewhere.
+
+    >>> timings = BuildTimings(top_n=1)
+    >>> docs = CodeBaseDoc(['examples'], timings=timings)
+    >>> report = timings.to_dict()
+    >>> report['phases']['parse']['calls']
+    4
+    >>> len(report['slowest_files']['parse'])
+    1
+
+    """
+
+    def __init__(self, top_n=10):
+        self.top_n = top_n
+        self.phases = {}
+        self.files = {}
+        self.counters = {}
+
+    def record(self, phase, seconds, file=None):
+        """
+        Record that `phase` took `seconds`, for `file` if given.
+        """
+        entry = self.phases.setdefault(phase, [0.0, 0])
+        entry[0] += seconds
+        entry[1] += 1
+        if file is not None:
+            files = self.files.setdefault(phase, {})
+            files[file] = files.get(file, 0.0) + seconds
+
+    def count(self, counter, n=1):
+        """
+        Add `n` to the named counter.
+        """
+        self.counters[counter] = self.counters.get(counter, 0) + n
+
+    def to_dict(self):
+        """
+        Return the measurements as a dict with these keys:
+
+            - **phases**: A dict from phase name to its total **seconds**
+              and number of **calls**.
+            - **slowest_files**: A dict from phase name to a list of the
+              `top_n` slowest files in that phase, as **file** and
+              **seconds**, slowest first.
+            - **counters**: A dict from counter name to count.
+        """
+        slowest = {}
+        for phase, files in self.files.items():
+            ranked = sorted(files.items(), key=lambda item: -item[1])
+            slowest[phase] = [{'file': file, 'seconds': seconds}
+                              for file, seconds in ranked[:self.top_n]]
+        return {
+            'phases': dict((phase, {'seconds': seconds, 'calls': calls})
+                           for phase, (seconds, calls) in self.phases.items()),
+            'slowest_files': slowest,
+            'counters': dict(self.counters)
+        }
+
+    def to_json(self):
+        """
+        Return the measurements as JSON.  Keys are as per `to_dict`.
+        """
+        return encode_json(self.to_dict())
+
 class CodeBaseDoc(dict):
     """
     Represents the documentation for an entire codebase.
@@ -364,9 +963,16 @@ class CodeBaseDoc(dict):
     chopping) should match the names declared in @dependency or @see tags;
     otherwise, you may get MissingDependencyErrors.
 
+    A cycle among @dependency tags doesn't stop the codebase from loading.
+    Each cycle is reported with a warning and listed, as per `find_cycles`,
+    in `dependency_cycles`; the files in a cycle or depending on one are in
+    `cyclic_files`.  Asking `find_dependencies` for any of those files still
+    raises CyclicDependency; `load_order` keeps each cycle together instead.
+
     """
 
-    def __init__(self, root_paths, include_private=False):
+    def __init__(self, root_paths, include_private=False, cache_dir=None,
+                 workers=1, timings=None, templates=None):
         """
         Create a new `CodeBaseDoc`.  `root_paths` is a list of directories
         where JavaScript files can be found.  @see and @dependency tags
@@ -374,35 +980,219 @@ class CodeBaseDoc(dict):
 
         By default, private methods are not included.  Pass True to
         `include_private` to include them.
+
+        If `cache_dir` is given, parsed files are cached there between runs
+        (see `ParseCache`), and the cache is available as `parse_cache`.
+
+        Files are parsed in a pool of `workers` processes if that's more than
+        one.  The result is the same as a serial build, down to key order:
+
+        >>> list(CodeBaseDoc(['examples'], workers=2)) == \\
+        ...     list(CodeBaseDoc(['examples']))
+        True
+
+        If `timings` is given, it's a `BuildTimings` (or compatible object)
+        that is told how long each phase takes, here and in `save_docs`.
+        It's available as the `timings` attribute.
+
+        Pages are rendered with `templates`, a `TemplateSet` (default:
+        `default_templates()`), available as the `templates` attribute.
         """
         self.include_private = include_private
+        self.parse_cache = cache_dir and ParseCache(cache_dir) or None
+        self.workers = workers
+        self.timings = timings
+        self.templates = templates or default_templates()
+        self.render_stats = []
+        self.root_paths = root_paths
+        self.file_paths = {}
+        self._indexes = {}
+        self._stale_dependencies = False
+        self.dependency_cycles = []
+        self.cyclic_files = set()
         self._populate_files(root_paths, root_paths)
+        start = time.time()
         self._build_dependencies()
+        self._record('dependencies', start)
+        start = time.time()
         self._build_superclass_lists()
+        self._record('superclasses', start)
+
+    def _record(self, phase, start, file=None):
+        """
+        Report to `timings`, if there is one, that `phase` ran from `start`
+        until now.
+        """
+        if self.timings is not None:
+            self.timings.record(phase, time.time() - start, file)
 
     def _populate_files(self, root_paths, prefix):
+        self._prefix = prefix
+        start = time.time()
         files = get_file_list(root_paths)
-        def key_name(file_name):
-            if prefix is None:
-                return os.path.basename(file_name)
-            for pre in prefix:
-                if not pre.endswith('/'):
-                    pre = pre + '/'
-                if file_name.startswith(pre):
-                    return file_name[len(pre):]
-            return file_name
-
-        for file in files:
-            name = key_name(file)
-            self[name] = FileDoc(name, read_file(file))
+        self._record('walk', start)
+        if self.workers > 1 and len(files) > 1:
+            start = time.time()
+            parsed = self._parse_in_pool(files)
+            self._record('parse_pool', start)
+            for file, comments in zip(files, parsed):
+                self._add_file(file,
+                               FileDoc(self.key_name(file), None, comments))
+        else:
+            for file in files:
+                self._add_file(file, self._timed_load(file))
+
+    def key_name(self, file_name):
+        """
+        Return the key for the JS file at path `file_name`: the path relative
+        to whichever root path contains it.
+        """
+        if self._prefix is None:
+            return os.path.basename(file_name)
+        for pre in self._prefix:
+            if not pre.endswith('/'):
+                pre = pre + '/'
+            if file_name.startswith(pre):
+                return file_name[len(pre):]
+        return file_name
+
+    def _load_file(self, file):
+        """
+        Read and parse the file at path `file` into a `FileDoc`, going
+        through the parse cache if there is one.
+        """
+        name = self.key_name(file)
+        if self.parse_cache:
+            return FileDoc(name, None, self.parse_cache.parse_file(file))
+        else:
+            return FileDoc(name, read_file(file))
+
+    def _timed_load(self, file):
+        start = time.time()
+        file_doc = self._load_file(file)
+        self._record('parse', start, file_doc.name)
+        return file_doc
+
+    def _add_file(self, file, file_doc):
+        self.file_paths[file_doc.name] = file
+        self[file_doc.name] = file_doc
+
+    def reload_files(self, changed=(), deleted=()):
+        """
+        Bring the codebase up to date after the JS files at the paths in
+        `changed` were modified or added, and those in `deleted` removed.
+        Only those files are re-parsed.  If no file was added or removed and
+        none of the reloaded files changed its `FileDoc.interface`, the
+        lookup tables and page signatures of the other files are kept;
+        otherwise everything is recomputed.  Superclass lists are always
+        recomputed.
+
+        Raises MissingDependency like the constructor.  In that case the
+        codebase stays usable, and dependencies are recomputed on the next
+        reload.
+        """
+        structure_changed = self._stale_dependencies
+        preserved_indexes = dict(self._indexes)
+        replaced = []
+        for file in deleted:
+            name = self.key_name(file)
+            if name in self:
+                del self[name]
+                self.file_paths.pop(name, None)
+                structure_changed = True
+        for file in changed:
+            file_doc = self._timed_load(file)
+            old_doc = dict.get(self, file_doc.name)
+            if old_doc and hasattr(old_doc.module, 'all_dependencies') and \
+                    old_doc.interface() == file_doc.interface():
+                file_doc.set_all_dependencies(old_doc.module.all_dependencies)
+                replaced.append((old_doc, file_doc))
+            else:
+                structure_changed = True
+            self._add_file(file, file_doc)
+
+        if structure_changed:
+            self._stale_dependencies = True
+            self._build_dependencies()
+            self._stale_dependencies = False
+        else:
+            self._indexes.update(preserved_indexes)
+            signatures = self._indexes.get('signatures', {})
+            for old_doc, file_doc in replaced:
+                signatures.pop(file_doc.name, None)
+                for attr in ('functions', 'methods', 'classes'):
+                    index = self._indexes.get(attr)
+                    if index is None:
+                        continue
+                    for old_obj, new_obj in zip(getattr(old_doc, attr),
+                                                getattr(file_doc, attr)):
+                        if index.get(old_obj.name) is old_obj:
+                            index[new_obj.name] = new_obj
+        self._build_superclass_lists()
+
+    def _parse_in_pool(self, files):
+        """
+        Parse `files` in a pool of `self.workers` processes, returning their
+        parsed comments in the same order.  Each worker reads and writes the
+        parse cache directly; hits and misses are added to `parse_cache`.
+        """
+        import multiprocessing
+        cache_dir = self.parse_cache and self.parse_cache.cache_dir
+        jobs = [(file, cache_dir) for file in files]
+        pool = multiprocessing.Pool(self.workers)
+        try:
+            results = pool.map(_parse_file_job, jobs,
+                    max(1, len(jobs) // (self.workers * 4)))
+        finally:
+            pool.close()
+            pool.join()
+
+        for comments, hit in results:
+            if hit is True:
+                self.parse_cache.hits += 1
+            elif hit is False:
+                self.parse_cache.misses += 1
+        return [comments for comments, hit in results]
+
+    def __setitem__(self, name, file_doc):
+        dict.__setitem__(self, name, file_doc)
+        self._invalidate_indexes()
+
+    def __delitem__(self, name):
+        dict.__delitem__(self, name)
+        self._invalidate_indexes()
+
+    def update(self, *args, **kwargs):
+        dict.update(self, *args, **kwargs)
+        self._invalidate_indexes()
+
+    def pop(self, *args):
+        self._invalidate_indexes()
+        return dict.pop(self, *args)
+
+    def clear(self):
+        dict.clear(self)
+        self._invalidate_indexes()
+
+    def _invalidate_indexes(self):
+        """
+        Throw away all cached lookup tables.  Called whenever a file is added,
+        replaced, or removed; the tables are rebuilt on next use.
+        """
+        self._indexes.clear()
 
     def _build_dependencies(self):
         """
         >>> CodeBaseDoc(['examples'])['subclass.js'].module.all_dependencies
         ['module.js', 'module_closure.js', 'class.js', 'subclass.js']
         """
+        all_dependencies, cycles, cyclic_files = analyze_dependencies(self)
+        self.dependency_cycles = cycles
+        self.cyclic_files = cyclic_files
+        if cycles:
+            warn('%s', CyclicDependency(sorted(cyclic_files), cycles))
         for module in list(self.values()):
-            module.set_all_dependencies(find_dependencies([module.name], self))
+            module.set_all_dependencies(all_dependencies[module.name])
 
     def _build_superclass_lists(self):
         """
@@ -411,25 +1201,171 @@ class CodeBaseDoc(dict):
         """
         cls_dict = self.all_classes
         for cls in list(cls_dict.values()):
-            cls.all_superclasses = []
-            superclass = cls.superclass
-            try:
-                while superclass:
-                    superclass_obj = cls_dict[superclass]
-                    cls.all_superclasses.append(superclass_obj)
-                    superclass = superclass_obj.superclass
-            except KeyError:
-                print("Missing superclass: " + superclass)
+            cls.all_superclasses = self._superclass_chain(cls, cls_dict)
+
+    def _superclass_chain(self, cls, cls_dict):
+        """
+        Return the list of `ClassDoc` superclasses of `cls`, nearest first,
+        looking them up by name in `cls_dict`.
+        """
+        chain = []
+        superclass = cls.superclass
+        try:
+            while superclass:
+                superclass_obj = cls_dict[superclass]
+                chain.append(superclass_obj)
+                superclass = superclass_obj.superclass
+        except KeyError:
+            print("Missing superclass: " + superclass)
+        return chain
+
+    def _dependents_index(self):
+        """
+        Return the lookup tables for `dependents_of`: a dict from each file
+        to the files that directly depend on it, and a dict from each file
+        to its position in the order of `strongly_connected_components`,
+        which puts each file after its dependencies even if there are
+        cycles.  They're cached along with the other lookup tables.
+        """
+        try:
+            return self._indexes['dependents']
+        except KeyError:
+            pass
+        graph = build_full_dependency_graph(self)
+        positions = dict((name, i) for i, name in enumerate(
+                flatten(strongly_connected_components(graph))))
+        dependents = dict((name, []) for name in graph)
+        for name in self:
+            for dependency in graph[name]:
+                dependents[dependency].append(name)
+        index = self._indexes['dependents'] = (dependents, positions)
+        return index
+
+    def dependents_of(self, files):
+        """
+        Return every file affected by a change to any of `files`: the files
+        themselves and everything that transitively depends on them, sorted
+        so that no file appears before its dependencies.  Files in a cycle
+        come together, after the files the cycle depends on.
+
+        >>> docs = CodeBaseDoc(['examples'])
+        >>> docs.dependents_of(['module.js'])
+        ['module.js', 'module_closure.js', 'subclass.js']
+
+        Cycles don't get in the way:
+
+        >>> docs['module.js'] = FileDoc('module.js',
+        ...     '/**\\n * A module.\\n * @dependency subclass.js\\n */\\n')
+        >>> docs.dependents_of(['class.js'])
+        ['class.js', 'subclass.js', 'module.js', 'module_closure.js']
+
+        Once the reverse dependency index is built, this takes time
+        proportional to the number of affected files.  Raises
+        MissingDependency if the codebase has one, and KeyError if one of
+        `files` isn't in the codebase.
+        """
+        dependents, positions = self._dependents_index()
+        affected = set(files)
+        stack = list(affected)
+        while stack:
+            for dependent in dependents[stack.pop()]:
+                if dependent not in affected:
+                    affected.add(dependent)
+                    stack.append(dependent)
+        return sorted(affected, key=positions.__getitem__)
+
+    def load_order(self, files):
+        """
+        Return `files` and all their dependencies, in the order they should
+        be loaded, as `find_dependencies` does.  If there's a cycle among
+        them, rather than raising CyclicDependency, the files in it come
+        together after the files it depends on, as in each file's
+        `all_dependencies`:
+
+        >>> CodeBaseDoc(['examples']).load_order(['module_closure.js'])
+        ['module.js', 'module_closure.js']
+        >>> root = os.path.join(tempfile.mkdtemp(), 'js')
+        >>> shutil.copytree('examples', root) == root
+        True
+        >>> save_file(os.path.join(root, 'module.js'),
+        ...     '/**\\n * A module.\\n * @dependency subclass.js\\n */\\n')
+        >>> CodeBaseDoc([root]).load_order(['class.js', 'module.js'])
+        ['class.js', 'subclass.js', 'module.js', 'module_closure.js']
+        >>> shutil.rmtree(os.path.dirname(root))
+
+        """
+        try:
+            return find_dependencies(list(files), self)
+        except CyclicDependency:
+            # all_dependencies is worked out with analyze_dependencies, and
+            # each file in it comes after its own dependencies.
+            order = []
+            seen = set()
+            for name in files:
+                for dependency in self[name].module.all_dependencies:
+                    if dependency not in seen:
+                        seen.add(dependency)
+                        order.append(dependency)
+            return order
+
+    def write_bundle(self, files, bundle_path, map_path=None):
+        """
+        Concatenate `files` and all their dependencies, in the order given
+        by `load_order`, into a single file at `bundle_path`.  The files are
+        copied byte for byte, as by `cat`, using `append_file`.  Returns a
+        list of dicts giving the **file** name, the **offset** at which it
+        starts in the bundle and its **length**, which is also written as
+        JSON to `map_path` if that's given.
+
+        >>> path = os.path.join(tempfile.mkdtemp(), 'bundle.js')
+        >>> docs = CodeBaseDoc(['examples'])
+        >>> entries = docs.write_bundle(['module_closure.js'], path)
+        >>> [entry['file'] for entry in entries]
+        ['module.js', 'module_closure.js']
+        >>> entries[1]['offset'] == len(read_file('examples/module.js'))
+        True
+        >>> read_file(path) == read_file('examples/module.js') + \\
+        ...     read_file('examples/module_closure.js')
+        True
+        >>> shutil.rmtree(os.path.dirname(path))
+
+        """
+        entries = []
+        bundle = open(bundle_path, 'wb', 0)
+        try:
+            for name in self.load_order(files):
+                offset = bundle.tell()
+                length = append_file(bundle, self.file_paths[name])
+                entries.append({'file': name, 'offset': offset,
+                                'length': length})
+        finally:
+            bundle.close()
+        if map_path:
+            save_file(map_path, encode_json(entries))
+        return entries
 
     def _module_index(self, attr):
-        return dict((obj.name, obj) for module in list(self.values())
+        try:
+            return self._indexes[attr]
+        except KeyError:
+            index = self._indexes[attr] = dict(
+                    (obj.name, obj) for module in list(self.values())
                                     for obj in getattr(module, attr))
+            return index
 
     @property
     def all_functions(self):
         """
         Returns a dict of all functions in all modules of the codebase,
         keyed by their name.
+
+        The dict is built on first access and shared until a file is added,
+        replaced or removed, so callers shouldn't modify it.
+
+        >>> doc = CodeBaseDoc(['examples'])
+        >>> doc.all_functions is doc.all_functions
+        True
+
         """
         return self._module_index('functions')
 
@@ -442,11 +1378,48 @@ class CodeBaseDoc(dict):
 
     @property
     def all_classes(self):
-        """
-        Returns a dict of all classes in all modules.
+        r"""
+        Returns a dict of all classes in all modules.  Like `all_functions`,
+        this is cached until the set of files changes:
+
+        >>> doc = CodeBaseDoc(['examples'])
+        >>> 'Extra' in doc.all_classes
+        False
+        >>> doc['extra.js'] = FileDoc('extra.js', '/** An extra class.\n * @class Extra\n */')
+        >>> 'Extra' in doc.all_classes
+        True
+
         """
         return self._module_index('classes')
 
+    def _ref_index(self):
+        """
+        Return the lookup tables used by `translate_ref_to_url`: dicts from
+        standalone function name, class name, and (class name, method name)
+        to URL.  Where a name is defined more than once, the first definition
+        in file order wins.
+        """
+        try:
+            index = self._indexes['refs']
+            if self.timings is not None:
+                self.timings.count('ref_index_hits')
+            return index
+        except KeyError:
+            pass
+        start = time.time()
+        functions, classes, methods = {}, {}, {}
+        for file_doc in list(self.values()):
+            for fn in file_doc.functions:
+                functions.setdefault(fn.name, file_doc.url + fn.url)
+            for cls in file_doc.classes:
+                classes.setdefault(cls.name, file_doc.url + cls.url)
+                for method in cls.methods:
+                    methods.setdefault((cls.name, method.name),
+                                       file_doc.url + method.url)
+        index = self._indexes['refs'] = (functions, classes, methods)
+        self._record('ref_index', start)
+        return index
+
     def translate_ref_to_url(self, ref, in_comment=None):
         """
         Translates an @see or @link reference to a URL.  If the ref is of the 
@@ -476,11 +1449,25 @@ class CodeBaseDoc(dict):
         >>> doc.translate_ref_to_url('MyClass')
         'class.html#MyClass'
 
+        An unresolvable reference translates to the empty string:
+
+        >>> doc.translate_ref_to_url('NoSuchClass')
+        ''
+
         """
+        if self.timings is None:
+            return self._translate_ref(ref, in_comment)
+        self.timings.count('translate_ref_to_url')
+        url = self._translate_ref(ref, in_comment)
+        if not url:
+            self.timings.count('unresolved_refs')
+        return url
+
+    def _translate_ref(self, ref, in_comment):
         if ref.startswith('#'):
             method_name = ref[1:]
             if isinstance(in_comment, FunctionDoc) and in_comment.member:
-                search_in = self.all_classes[in_comment.member]
+                search_in = self.all_classes.get(in_comment.member)
             elif isinstance(in_comment, ClassDoc):
                 search_in = in_comment
             else:
@@ -490,45 +1477,46 @@ class CodeBaseDoc(dict):
                 return search_in.get_method(method_name).url
             except AttributeError:
                 pass
+            functions, classes, methods = self._ref_index()
+            return functions.get(method_name, '')
 
-            def lookup_ref(file_doc):
-                for fn in file_doc.functions:
-                    if fn.name == method_name:
-                        return fn.url
-                return None
-        elif '#' in ref:
-            class_name, method_name = ref.split('#')
-            def lookup_ref(file_doc):
-                for cls in file_doc.classes:
-                    if cls.name == class_name:
-                        try:
-                            return cls.get_method(method_name).url
-                        except AttributeError:
-                            pass
-                return None
+        functions, classes, methods = self._ref_index()
+        if '#' in ref:
+            return methods.get(tuple(ref.split('#', 1)), '')
         else:
-            class_name = ref
-            def lookup_ref(file_doc):
-                for cls in file_doc.classes:
-                    if cls.name == class_name:
-                        return cls.url
-                return None
+            return classes.get(ref, '')
 
-        for file_doc in list(self.values()):
-            url = lookup_ref(file_doc)
-            if url:
-                return file_doc.url + url
-        return ''
+    def find_unresolved_refs(self, files=None):
+        """
+        Return a list of (filename, comment name, ref) triples for every @see
+        tag or {@link} in the codebase that `translate_ref_to_url` can't
+        resolve.  The optional `files` list restricts the search to specific
+        files.  Private functions are skipped unless `include_private` is set,
+        since their references never make it into the HTML.
+
+        >>> CodeBaseDoc(['examples']).find_unresolved_refs()
+        []
+
+        """
+        unresolved = []
+        for name in files or list(self.keys()):
+            for comment, ref in self[name].references():
+                if getattr(comment, 'is_private', False) and \
+                        not self.include_private:
+                    continue
+                if not self.translate_ref_to_url(ref, comment):
+                    unresolved.append((name,
+                            comment and comment.name or 'file_overview', ref))
+        return unresolved
 
     def build_see_html(self, see_tags, header_tag, in_comment=None):
-        def list_tag(see_tag):
-            return '<li><a href = "%s">%s</a></li>' % (
-                    self.translate_ref_to_url(see_tag, in_comment), see_tag)
-        if see_tags:
-            return '<%s>See Also:</%s>\n<ul>\n' % (header_tag, header_tag) + \
-                   '\n'.join(list_tag(tag) for tag in see_tags) + '</ul>'
-        else:
+        if not see_tags:
             return ''
+        see_item = self.templates['see_item']
+        return self.templates['see'].render(tag=header_tag, items='\n'.join(
+                see_item.render(url=self.translate_ref_to_url(tag, in_comment),
+                                ref=tag)
+                for tag in see_tags))
 
     def translate_links(self, text, in_comment=None):
         """
@@ -537,11 +1525,12 @@ class CodeBaseDoc(dict):
         `in_comment` is the `CommentDoc` that contains the text, for
         relative method lookups.
         """
+        render_link = self.templates['link'].render
         def replace_link(matchobj):
             ref = matchobj.group(1)
-            return '<a href = "%s">%s</a>' % (
-                    self.translate_ref_to_url(ref, in_comment), ref)
-        return re.sub('{@link ([\w#]+)}', replace_link, text)
+            return render_link(url=self.translate_ref_to_url(ref, in_comment),
+                               ref=ref)
+        return LINK_REGEXP.sub(replace_link, text)
 
     def to_json(self, files=None):
         """
@@ -550,6 +1539,67 @@ class CodeBaseDoc(dict):
         """
         return encode_json(self.to_dict(files))
 
+    def iter_json(self, files=None):
+        """
+        Generator of successive pieces of the same JSON text as `to_json`,
+        encoding one file at a time so memory use doesn't grow with the size
+        of the codebase.
+
+        >>> doc = CodeBaseDoc(['examples'])
+        >>> ''.join(doc.iter_json()) == doc.to_json()
+        True
+
+        """
+        keys = files or list(self.keys())
+        separator = '{'
+        for key in keys:
+            yield '%s%s: %s' % (separator, encode_json(key),
+                                encode_json(self[key].to_dict()))
+            separator = ', '
+        yield separator == '{' and '{}' or '}'
+
+    def iter_ndjson(self, files=None, per='file'):
+        """
+        Generator of newline-delimited JSON records, one line at a time.
+        If `per` is 'file', each record is a dict with the **file** name and
+        the list of its **comments**, as per `FileDoc.to_dict`; if it's
+        'comment', there is one record per comment, with the **file** name
+        and the **comment** dict.
+
+        >>> doc = CodeBaseDoc(['examples'])
+        >>> len(list(doc.iter_ndjson(['class.js'], 'comment')))
+        2
+
+        """
+        if per not in ('file', 'comment'):
+            raise ValueError('NDJSON records must be per file or per comment')
+        for key in files or list(self.keys()):
+            if per == 'file':
+                yield encode_json({'file': key,
+                                   'comments': self[key].to_dict()}) + '\n'
+            else:
+                for comment in self[key]:
+                    yield encode_json({'file': key,
+                                       'comment': comment.to_dict()}) + '\n'
+
+    def write_json(self, stream, files=None, ndjson=None):
+        """
+        Write JSON for the codebase (or just `files`) to the file-like
+        `stream` as it's encoded, flushing after each piece so consumers can
+        start right away.  By default this writes the same text as
+        `to_json`; pass 'file' or 'comment' as `ndjson` to write
+        newline-delimited records instead (see `iter_ndjson`).
+        """
+        start = time.time()
+        if ndjson:
+            chunks = self.iter_ndjson(files, ndjson)
+        else:
+            chunks = self.iter_json(files)
+        for chunk in chunks:
+            stream.write(chunk)
+            stream.flush()
+        self._record('json', start)
+
     def to_dict(self, files=None):
         """
         Converts the CodeBaseDoc into a dictionary containing the to_dict()
@@ -568,79 +1618,638 @@ class CodeBaseDoc(dict):
         """
         Builds basic HTML for the full module index.
         """
-        return '<h1>Module index</h1>\n' + \
-                make_index('all_modules', list(self.values()))
+        return render_html(self.write_html)
+
+    def write_html(self, out):
+        """
+        Write the HTML for the full module index to `out`.
+        """
+        self.templates['module_index'].write(out, index=lambda out:
+                write_index(out, 'all_modules', list(self.values()),
+                            self.templates))
+
+    def search_index(self, files=None):
+        """
+        Return the index searched by the search page, built in one pass over
+        `files` (default: all files), as a dictionary with the keys:
+
+            - **version**: Version of the index format, `SEARCH_INDEX_VERSION`
+            - **kinds**: The kinds of entry, as per `SEARCH_KINDS`
+            - **files**: The URL of each file's page
+            - **entries**: A list of [name, kind, file, member class,
+              summary] lists, where kind and file are positions in the
+              lists above, the member class is the class a method belongs
+              to (or an empty string, and otherwise part of the method's
+              anchor, as per the `method` template), and the summary is
+              the first sentence of the documentation.  They're sorted by
+              lowercased name, so prefix matches can be found by binary
+              search.
+
+        Private functions and methods are only indexed if they'd be
+        documented.
+
+        >>> index = CodeBaseDoc(['examples']).search_index()
+        >>> name, kind, file, member, summary = [entry for entry
+        ...     in index['entries'] if entry[0] == 'public_method'][0]
+        >>> index['kinds'][kind], index['files'][file], member, summary
+        ('method', 'subclass.html', 'MySubClass', 'A public method.')
 
-    def save_docs(self, files=None, output_dir=None):
+        """
+        def visible(fn):
+            return self.include_private or not fn.is_private
+        def summary(doc):
+            return ' '.join(first_sentence(doc).split())
+        if files is None:
+            files = list(self.keys())
+        urls = []
+        entries = []
+        for file_doc in (self[name] for name in files):
+            file_index = len(urls)
+            urls.append(file_doc.url)
+            entries.append([file_doc.name, 0, file_index, '',
+                            summary(file_doc.module.doc)])
+            for fn in file_doc.functions:
+                if visible(fn):
+                    entries.append([fn.name, 1, file_index, '',
+                                    summary(fn.doc)])
+            for cls in file_doc.classes:
+                entries.append([cls.name, 2, file_index, '',
+                                summary(cls.doc)])
+                for method in cls.methods:
+                    if visible(method):
+                        entries.append([method.name, 3, file_index, cls.name,
+                                        summary(method.doc)])
+        entries.sort(key=lambda entry: (entry[0].lower(), entry[0], entry[2]))
+        return {'version': SEARCH_INDEX_VERSION, 'kinds': SEARCH_KINDS,
+                'files': urls, 'entries': entries}
+
+    def _save_search(self, output_dir, is_current, pages, script):
+        """
+        Save the search page, its `script` (the contents of search.js, or
+        None if it wasn't found), and the search index (as JSONP
+        calling ``pyjsdocSearchIndex``, so it can be loaded from a script
+        tag) in `output_dir`.  Only the files whose pages are among `pages`,
+        the pages in the output directory, are indexed, so every result
+        links to an existing page.
+
+        The index is only rebuilt if `is_current` says the page signatures
+        of those files changed since it was last saved, so incremental
+        builds that only touch a few pages don't pay for re-encoding it.
+        The other files are left alone if they haven't changed.
+        """
+        names = [name for name in self.keys()
+                 if trim_js_ext(name) + '.html' in pages]
+        signature = content_hash(repr((SEARCH_INDEX_VERSION,
+                [(name, self._page_signature(self[name])) for name in names])))
+        if not is_current('search_index.js', signature):
+            save_file(os.path.join(output_dir, 'search_index.js'),
+                      'pyjsdocSearchIndex(%s);\n' % encode_json(
+                            self.search_index(names)))
+        save_file_if_changed(os.path.join(output_dir, 'search.html'),
+                render_html(write_html_page, 'Search',
+                            self.templates['search'].write, self.templates))
+        if script is None:
+            print('search.js not found.  Search will not work.')
+        else:
+            save_file_if_changed(os.path.join(output_dir, 'search.js'), script)
+
+    def index_shards(self, by):
+        """
+        Split the module index into shards, returning a list of (page name,
+        title, list of `FileDoc`) triples, each sorted by file name.  If `by`
+        is 'directory', there's one shard per directory; if it's a number,
+        there's one shard per file name prefix, with the prefixes just long
+        enough that no shard has more than that many modules.
+
+        >>> docs = CodeBaseDoc(['examples'])
+        >>> for page, title, modules in docs.index_shards(3):
+        ...     print('%s: %s' % (page, title))
+        index-c.html: class.js to class.js
+        index-m.html: module.js to module_closure.js
+        index-s.html: subclass.js to subclass.js
+        >>> [(page, title) for page, title, modules
+        ...  in docs.index_shards('directory')]
+        [('index-top.html', '(top level)')]
+
+        Splitting by prefix rather than into consecutive runs of modules
+        keeps the shards stable: adding or removing a module only changes
+        the shard with its prefix (which may split in two, or merge with
+        its neighbours), so incremental builds rewrite just that page.
+
+        >>> docs['about.js'] = FileDoc('about.js', '')
+        >>> [page for page, title, modules in docs.index_shards(3)]
+        ['index-a.html', 'index-c.html', 'index-m.html', 'index-s.html']
+
+        Shard pages never take the name of a module's page:
+
+        >>> docs['index-top.js'] = FileDoc('index-top.js', '')
+        >>> [page for page, title, modules in docs.index_shards('directory')]
+        ['index-top-2.html']
+
+        The price is that shards may be much smaller than the page size.
+        Sharding by directory is usually the better choice for codebases
+        laid out in directories.
+        """
+        modules = sorted(self.values(), key=lambda doc: doc.name)
+        if by == 'directory':
+            groups = {}
+            for doc in modules:
+                groups.setdefault(os.path.dirname(doc.name), []).append(doc)
+            keys = sorted(groups)
+            titles = [directory or '(top level)' for directory in keys]
+            bases = [re.sub(r'[^\w.]+', '-', directory) or 'top'
+                     for directory in keys]
+        else:
+            size = int(by)
+            if size < 1:
+                raise ValueError('Index pages must hold at least one module')
+            groups = dict(split_by_prefix(modules, size))
+            keys = sorted(groups)
+            titles = ['%s to %s' % (groups[prefix][0].name,
+                                    groups[prefix][-1].name)
+                      for prefix in keys]
+            bases = [re.sub(r'[^\w.]+', '-', prefix) or 'all'
+                     for prefix in keys]
+        shards = []
+        # Shard pages mustn't overwrite the page of a module that happens
+        # to be called, say, index-top.js.
+        pages = set(doc.url for doc in modules)
+        for key, title, base in zip(keys, titles, bases):
+            page = 'index-%s.html' % base
+            suffix = 1
+            while page in pages:
+                suffix += 1
+                page = 'index-%s-%d.html' % (base, suffix)
+            pages.add(page)
+            shards.append((page, title, groups[key]))
+        return shards
+
+    def _index_signature(self, modules=None, title=None):
+        """
+        Return a hash of everything the module index page, or the index
+        shard with `title` listing `modules`, depends on.
+        """
+        if modules is None:
+            modules = self.values()
+        return content_hash(repr((MANIFEST_VERSION, self.templates.digest(),
+                title, [(doc.name, first_sentence(doc.doc)) for doc in modules])))
+
+    def _save_index(self, output_dir, is_current, index_shards):
+        """
+        Save the module index in `output_dir`: a single index.html, or if
+        `index_shards` is given, one page per shard as per `index_shards`
+        and an index.html listing the shards.  Pages for which `is_current`
+        returns True aren't rewritten.
+        """
+        templates = self.templates
+        if not index_shards:
+            if not is_current('index.html', self._index_signature()):
+                save_html_page('%s/index.html' % output_dir, 'Module index',
+                               self.write_html, templates)
+            return
+
+        shards = self.index_shards(index_shards)
+        for page, title, modules in shards:
+            if is_current(page, self._index_signature(modules, title)):
+                continue
+            save_html_page('%s/%s' % (output_dir, page),
+                    'Module index: %s' % title,
+                    lambda out: templates['index_shard'].write(out,
+                            title=title, index=lambda out: write_index(out,
+                                    'all_modules', modules, templates)),
+                    templates)
+
+        summary = [(page, title, len(modules))
+                   for page, title, modules in shards]
+        def write_shard_list(out):
+            write_entry = templates['index_entry'].write
+            def write_entries(out):
+                for i, (page, title, count) in enumerate(summary):
+                    if i:
+                        out.write('\n')
+                    write_entry(out, name=title, url=page,
+                                doc=count == 1 and '1 module' or
+                                    '%d modules' % count)
+            templates['index'].write(out, css_class='index_shards',
+                                     entries=write_entries)
+        signature = content_hash(repr((MANIFEST_VERSION, templates.digest(),
+                                       summary)))
+        if not is_current('index.html', signature):
+            save_html_page('%s/index.html' % output_dir, 'Module index',
+                    lambda out: templates['module_index'].write(out,
+                                                    index=write_shard_list),
+                    templates)
+
+    def _page_signature(self, file_doc):
+        """
+        Return a hash of everything the documentation page for `file_doc`
+        depends on: its parsed comments, the URLs its references resolve to,
+        its transitive dependencies and the superclass chains of its classes.
+        Signatures are cached along with the other lookup tables.
+        """
+        signatures = self._indexes.setdefault('signatures', {})
+        try:
+            return signatures[file_doc.name]
+        except KeyError:
+            pass
+        signature = signatures[file_doc.name] = content_hash(repr((
+            MANIFEST_VERSION,
+            self.templates.digest(),
+            self.include_private,
+            file_doc.digest(),
+            [(ref, self.translate_ref_to_url(ref, comment))
+             for comment, ref in file_doc.references()],
+            getattr(file_doc.module, 'all_dependencies', []),
+            [[superclass.name for superclass in
+              getattr(cls, 'all_superclasses', [])]
+             for cls in file_doc.classes])))
+        return signature
+
+    def _write_page(self, output_dir, doc):
+        """
+        Render the documentation page for `doc` and save it in `output_dir`.
+        The page is written as it's rendered, without building it in memory.
+        """
+        start = time.time()
+        save_html_page('%s/%s' % (output_dir, doc.url), doc.name,
+                       lambda out: doc.write_html(out, self), self.templates)
+        self._record('render', start, doc.name)
+
+    def _render_in_pool(self, output_dir, names, workers):
+        """
+        Render and save the pages for `names` in a pool of `workers` forked
+        processes, each sharing this codebase read-only.  Returns per-worker
+        statistics, as per `save_docs`.
+        """
+        import multiprocessing
+        global _render_codebase
+        # Build the lookup tables once here, rather than once per worker.
+        self._ref_index()
+        self.all_classes
+        chunk_size = max(1, min(64, len(names) // (workers * 4)))
+        jobs = [(output_dir, names[i:i + chunk_size])
+                for i in range(0, len(names), chunk_size)]
+
+        _render_codebase = self
+        pool = multiprocessing.get_context('fork').Pool(workers)
+        try:
+            results = pool.map(_render_pages_job, jobs, 1)
+        finally:
+            pool.close()
+            pool.join()
+            _render_codebase = None
+
+        stats = {}
+        for worker, pages, seconds in results:
+            entry = stats.setdefault(worker, [0, 0.0])
+            entry[0] += pages
+            entry[1] += seconds
+        return [{'worker': worker, 'pages': pages, 'seconds': seconds}
+                for worker, (pages, seconds) in sorted(stats.items())]
+
+    def save_docs(self, files=None, output_dir=None, incremental=False,
+                  workers=None, index_shards=None):
         """
         Save documentation files for codebase into `output_dir`.  If output
         dir is None, it'll refrain from building the index page and build
         the file(s) in the current directory.
 
         If `files` is None, it'll build all files in the codebase.
+
+        When there's an output directory, a manifest (see `load_manifest`)
+        records what each page was built from.  If `incremental` is True,
+        pages whose inputs haven't changed since the last build are neither
+        re-rendered nor rewritten.  Full builds also remove pages for files
+        that no longer exist.
+
+        Unresolved references are reported for every page written.
+
+        Pages are rendered and written by a pool of `workers` processes
+        (default: the `workers` the codebase was created with) where
+        processes are forked by default, as per `fork_is_default`; the output
+        is the same as rendering them serially.
+        Afterwards, `render_stats` holds a list of dicts with the **worker**
+        process ID, number of **pages** it rendered, and **seconds** it spent.
+
+        With an output directory, a search page is saved along with the
+        module index, indexing the pages built now or by earlier builds; see
+        `search_index` and `_save_search`.  For large
+        codebases, pass 'directory' or a page size as `index_shards` to split
+        the module index into pages, as per `index_shards`, under a short
+        index.html linking to them.  Incremental builds then only rewrite
+        the shards whose modules changed.
+
+        If the codebase has `timings`, each phase of the build is reported
+        there; pages rendered in worker processes are only timed as a whole.
         """
+        build_start = time.time()
+        if workers is None:
+            workers = self.workers
         if output_dir:
             try:
                 os.mkdir(output_dir)
             except OSError:
                 pass
 
-            try:
-                import pkg_resources
-                save_file(os.path.join(output_dir, 'jsdoc.css'),
-                    pkg_resources.resource_string(__name__, 'static/jsdoc.css'))
-            except (ImportError, IOError):
-                try:
-                    import shutil
-                    base_dir = os.path.dirname(os.path.realpath(__file__))
-                    css_file = os.path.join(base_dir, 'jsdoc.css')
-                    shutil.copy(css_file, output_dir)
-                except IOError:
-                    print('jsdoc.css not found.  HTML will not be styled.')
-
-            save_file('%s/index.html' % output_dir, 
-                    build_html_page('Module index', self.to_html()))
+            # The first lookup may import pkg_resources, which takes longer
+            # than building a small codebase, so it's timed on its own.
+            start = time.time()
+            stylesheet = load_static_file('jsdoc.css')
+            script = load_static_file('search.js')
+            self._record('static_files', start)
+            if stylesheet is None:
+                print('jsdoc.css not found.  HTML will not be styled.')
+            else:
+                save_file_if_changed(os.path.join(output_dir, 'jsdoc.css'),
+                                     stylesheet)
+
+            old_manifest = load_manifest(output_dir)
+            manifest = {}
+            def is_current(page, signature):
+                manifest[page] = signature
+                return incremental and old_manifest.get(page) == signature \
+                        and os.path.exists(os.path.join(output_dir, page))
+
+            start = time.time()
+            self._save_index(output_dir, is_current, index_shards)
+            self._record('index', start)
         else:
             output_dir = '.'
+            manifest = None
+            def is_current(page, signature):
+                return False
 
-        if files is None:
+        build_all = files is None
+        if build_all:
             files = list(self.keys())
 
+        start = time.time()
+        to_render = []
         for filename in files:
             try:
                 doc = self[filename]
-                save_file('%s/%s.html' % (output_dir, trim_js_ext(doc.name)), 
-                        build_html_page(doc.name, doc.to_html(self)))
             except KeyError:
                 warn('File %s does not exist', filename)
+                continue
+            if manifest is not None and \
+                    is_current(doc.url, self._page_signature(doc)):
+                continue
+            to_render.append(filename)
+        self._record('signatures', start)
+
+        if workers > 1 and len(to_render) > 1 and \
+                fork_is_default():
+            start = time.time()
+            self.render_stats = self._render_in_pool(output_dir, to_render,
+                                                     workers)
+            self._record('render_pool', start)
+        else:
+            start = time.time()
+            for filename in to_render:
+                self._write_page(output_dir, self[filename])
+            self.render_stats = [{'worker': os.getpid(),
+                                  'pages': len(to_render),
+                                  'seconds': time.time() - start}]
+
+        if manifest is not None:
+            start = time.time()
+            pages = set(manifest)
+            if not build_all:
+                pages.update(old_manifest)
+            self._save_search(output_dir, is_current, pages, script)
+            self._record('search_index', start)
+
+        start = time.time()
+        if manifest is not None:
+            for page, signature in old_manifest.items():
+                if page in manifest:
+                    continue
+                if build_all:
+                    try:
+                        os.remove(os.path.join(output_dir, page))
+                    except OSError:
+                        pass
+                else:
+                    manifest[page] = signature
+            save_manifest(output_dir, manifest)
+        self._record('manifest', start)
+
+        start = time.time()
+        for filename, comment_name, ref in self.find_unresolved_refs(
+                to_render):
+            warn('Unresolved reference %s in %s (%s)', ref, filename,
+                 comment_name)
+        self._record('unresolved_refs', start)
+        self._record('save_docs', build_start)
+
+_render_codebase = None
+
+def _render_pages_job(job):
+    """
+    Worker for parallel rendering in `CodeBaseDoc.save_docs`.  `job` is an
+    (output_dir, filenames) pair; the codebase is inherited from the parent
+    process through `_render_codebase`.  Returns (process ID, number of
+    pages, seconds taken).
+    """
+    output_dir, names = job
+    start = time.time()
+    for name in names:
+        _render_codebase._write_page(output_dir, _render_codebase[name])
+    return os.getpid(), len(names), time.time() - start
 
-class FileDoc(object):
+def fork_is_default():
+    """
+    Return True if multiprocessing starts processes by forking, either by
+    default on this platform or because the program chose it with
+    ``multiprocessing.set_start_method('fork')``.  Rendering in a pool
+    relies on workers forked from a loaded codebase, so otherwise pages are
+    rendered serially.  In particular, forking isn't the default on macOS,
+    where it's unsafe once system frameworks have been loaded.
+    """
+    try:
+        import multiprocessing
+        return multiprocessing.get_start_method() == 'fork'
+    except (ImportError, AttributeError):
+        return False
+
+class LazyCodeBaseDoc(CodeBaseDoc):
+    """
+    A `CodeBaseDoc` that only parses files when they're needed.  The keys
+    come from the directory walk, but each `FileDoc` is read and parsed on
+    first access, whether directly, through a dependency lookup, or when one
+    of the codebase-wide indexes is built.  Transitive dependencies and
+    superclass lists are likewise computed when first asked for, so working
+    with one file costs about as much as its dependency closure:
+
+    >>> docs = LazyCodeBaseDoc(['examples'])
+    >>> docs.loaded_files()
+    []
+    >>> docs['module_closure.js'].module.all_dependencies
+    ['module.js', 'module_closure.js']
+    >>> docs.loaded_files()
+    ['module.js', 'module_closure.js']
+
+    Anything that needs the whole codebase, like `all_classes` or
+    `save_docs`, loads every file:
+
+    >>> docs.all_classes['MySubClass'].all_superclasses[0].name
+    'MyClass'
+    >>> len(docs.loaded_files()) == len(docs)
+    True
+
+    Files are always parsed in this process, so `workers` only applies to
+    rendering.
     """
+
+    def _populate_files(self, root_paths, prefix):
+        self._prefix = prefix
+        for file in get_file_list(root_paths):
+            name = self.key_name(file)
+            self.file_paths[name] = file
+            dict.__setitem__(self, name, None)
+
+    def __getitem__(self, name):
+        file_doc = dict.__getitem__(self, name)
+        if file_doc is None:
+            file_doc = self._timed_load(self.file_paths[name])
+            self._defer_dependencies(file_doc)
+            self._defer_superclass_lists(file_doc)
+            # Loading doesn't change what's in the codebase, so the indexes
+            # stay valid.
+            dict.__setitem__(self, name, file_doc)
+        return file_doc
+
+    def get(self, name, default=None):
+        if name in self:
+            return self[name]
+        return default
+
+    def values(self):
+        return [self[name] for name in self]
+
+    def items(self):
+        return [(name, self[name]) for name in self]
+
+    def loaded_files(self):
+        """
+        Return the names of the files that have been parsed so far, in key
+        order.
+        """
+        return [name for name, file_doc in dict.items(self)
+                if file_doc is not None]
+
+    def _loaded_docs(self):
+        return [file_doc for file_doc in dict.values(self)
+                if file_doc is not None]
+
+    def _defer_dependencies(self, file_doc):
+        file_doc.set_all_dependencies(
+                lambda: self._analyze_closure(file_doc.name))
+
+    def _analyze_closure(self, name):
+        """
+        Return the transitive dependencies of `name`, working them out with
+        `analyze_dependencies` over just its dependency closure.  Cycles
+        there are warned about and added to `dependency_cycles` and
+        `cyclic_files`, as `CodeBaseDoc` does for the whole codebase:
+
+        >>> docs = LazyCodeBaseDoc(['examples'])
+        >>> docs['module.js'] = FileDoc('module.js',
+        ...     '/**\\n * A module.\\n * @dependency module_closure.js\\n */\\n')
+        >>> docs['subclass.js'].module.all_dependencies
+        ['module_closure.js', 'module.js', 'class.js', 'subclass.js']
+        >>> sorted(docs.dependency_cycles[0][0])
+        ['module.js', 'module_closure.js']
+
+        """
+        closure = build_dependency_graph([name], self)[0]
+        all_dependencies, cycles, cyclic_files = analyze_dependencies(
+                dict((file, self[file]) for file in closure))
+        self.cyclic_files.update(cyclic_files)
+        new_cycles = [cycle for cycle in cycles
+                      if cycle not in self.dependency_cycles]
+        if new_cycles:
+            self.dependency_cycles.extend(new_cycles)
+            warn('%s', CyclicDependency(sorted(cyclic_files), new_cycles))
+        return all_dependencies[name]
+
+    def _defer_superclass_lists(self, file_doc):
+        for cls in file_doc.classes:
+            cls.all_superclasses = \
+                    lambda cls=cls: self._superclass_chain(cls, self.all_classes)
+
+    def _build_dependencies(self):
+        for file_doc in self._loaded_docs():
+            self._defer_dependencies(file_doc)
+
+    def _build_superclass_lists(self):
+        for file_doc in self._loaded_docs():
+            self._defer_superclass_lists(file_doc)
+
+class DependencyCodeBaseDoc(LazyCodeBaseDoc):
+    """
+    A `LazyCodeBaseDoc` for dependency queries only.  Each file is read just
+    far enough to find its module documentation (see `read_module_comment`),
+    so its `FileDoc` holds only a `ModuleDoc`, and `find_dependencies` reads
+    little more than the fileoverview blocks of the dependency closure:
+
+    >>> docs = DependencyCodeBaseDoc(['examples'])
+    >>> find_dependencies(['subclass.js'], docs)
+    ['module.js', 'module_closure.js', 'class.js', 'subclass.js']
+    >>> docs['subclass.js'].keys()
+    ['file_overview']
+
+    The parse cache isn't used, since a header is cheaper to read than to
+    look up.
+    """
+
+    def _load_file(self, file):
+        module = read_module_comment(file)
+        return FileDoc(self.key_name(file), None, module and [module] or [])
+
+class FileDoc(object):
+    r"""
     Represents documentaion for an entire file.  The constructor takes the
     source text for file, parses it, then provides a class wrapper around
     the parsed text.
+
+    Comments are sorted into modules, functions and classes as per
+    `classify_comment`:
+
+    >>> doc = FileDoc('foo.js', '/**\n * A module.\n * @dependency a.js\n */\n'
+    ...     'var init = function() {};\n'
+    ...     '/**\n * Foo class.\n * @class Foo\n */\n'
+    ...     'var Foo = function(a, b) {};\n'
+    ...     '/**\n * Bar.\n * @member Foo\n */\n'
+    ...     'Foo.prototype.bar = function() {};\n')
+    >>> doc.module.dependencies
+    ['a.js']
+    >>> [(cls.name, [method.name for method in cls.methods])
+    ...  for cls in doc.classes]
+    [('Foo', ['bar'])]
     """
 
-    def __init__(self, file_name, file_text):
+    def __init__(self, file_name, file_text, parsed_comments=None):
         """
         Construct a FileDoc.  `file_name` is the name of the JavaScript file,
-        `file_text` is its text.
+        `file_text` is its text.  If the text has already been parsed (for
+        example by a `ParseCache`), pass the result of `parse_file_comments`
+        as `parsed_comments` instead and `file_text` is ignored.
         """
         self.name = file_name
         self.order = []
         self.comments = { 'file_overview': ModuleDoc({}) }
+        if parsed_comments is None:
+            parsed_comments = parse_file_comments(file_text)
         is_first = True
-        for comment, next_line in get_doc_comments(file_text):
-            raw = parse_comment(strip_stars(comment), next_line)
-
-            if 'fileoverview' in raw:
+        for raw in parsed_comments:
+            kind = classify_comment(raw, is_first)
+            if kind == 'module':
                 obj = ModuleDoc(raw)
-            elif raw.get('function') or raw.get('guessed_function'):
+            elif kind == 'function':
                 obj = FunctionDoc(raw)
-            elif raw.get('class'):
+            elif kind == 'class':
                 obj = ClassDoc(raw)
-            elif is_first:
-                obj = ModuleDoc(raw)
             else:
                 continue
 
@@ -648,6 +2257,7 @@ class FileDoc(object):
             self.comments[obj.name] = obj
             is_first = False
 
+        self._partition_comments()
         for method in self.methods:
             try:
                 self.comments[method.member].add_method(method)
@@ -713,10 +2323,65 @@ class FileDoc(object):
         'This is the module documentati'
 
         """
-        if isinstance(index, int):
-            return self.comments[self.order[index]]
-        else:
-            return self.comments[index]
+        if isinstance(index, int):
+            return self.comments[self.order[index]]
+        else:
+            return self.comments[index]
+
+    def references(self):
+        """
+        Return a list of (comment, ref) pairs for every @see tag and {@link}
+        in the file.  `comment` is the
+        `CommentDoc` the reference is resolved relative to, or None for the
+        module documentation.
+
+        >>> file = FileDoc('subclass.js', read_file('examples/subclass.js'))
+        >>> [ref for comment, ref in file.references()]
+        ['#make_class', '#public_method']
+
+        """
+        try:
+            return self._references
+        except AttributeError:
+            pass
+        module = self.module
+        references = [(None, ref)
+                      for ref in LINK_REGEXP.findall(module.doc) + module.see]
+        for comment in self:
+            if isinstance(comment, ModuleDoc):
+                continue
+            references.extend((comment, ref) for ref in
+                              LINK_REGEXP.findall(comment.doc) + comment.see)
+        self._references = references
+        return references
+
+    def digest(self):
+        """
+        Return a hash of the file's parsed comments, which changes whenever
+        anything that ends up in the documentation does.
+        """
+        try:
+            return self._digest
+        except AttributeError:
+            self._digest = content_hash(repr(
+                    [list(self.module.parsed.items())] +
+                    [list(self.comments[name].parsed.items())
+                     for name in self.order]))
+            return self._digest
+
+    def interface(self):
+        """
+        Return a summary of everything about this file that the rest of the
+        codebase depends on: its dependencies and the names, members and
+        superclasses of its functions and classes.  If a new version of a
+        file has the same interface, no other file's documentation changes.
+        """
+        return (self.module.dependencies,
+                [fn.name for fn in self.functions],
+                [(method.name, method.member) for method in self.methods],
+                [(cls.name, cls.superclass,
+                  [method.name for method in cls.methods])
+                 for cls in self.classes])
 
     def set_all_dependencies(self, dependencies):
         """
@@ -742,9 +2407,23 @@ class FileDoc(object):
     def url(self):
         return trim_js_ext(self.name) + '.html'
 
-    def _filtered_iter(self, pred):
-        return (self.comments[name] for name in self.order 
-                if pred(self.comments[name]))
+    def _partition_comments(self):
+        """
+        Sort the comments into functions, methods and classes, in textual
+        order, for the properties below.  Called when the file is parsed.
+        """
+        self._functions = []
+        self._methods = []
+        self._classes = []
+        for name in self.order:
+            comment = self.comments[name]
+            if isinstance(comment, FunctionDoc):
+                if comment.member:
+                    self._methods.append(comment)
+                else:
+                    self._functions.append(comment)
+            elif isinstance(comment, ClassDoc):
+                self._classes.append(comment)
 
     @property
     def functions(self):
@@ -759,9 +2438,7 @@ class FileDoc(object):
         'not_auto_discovered'
 
         """
-        def is_function(comment):
-            return isinstance(comment, FunctionDoc) and not comment.member
-        return self._filtered_iter(is_function)
+        return iter(self._functions)
 
     @property
     def methods(self):
@@ -770,13 +2447,11 @@ class FileDoc(object):
         order.  
 
         >>> file = FileDoc('class.js', read_file('examples/class.js'))
-        >>> file.methods.next().name
+        >>> next(file.methods).name
         'first_method'
 
         """
-        def is_method(comment):
-            return isinstance(comment, FunctionDoc) and comment.member
-        return self._filtered_iter(is_method)
+        return iter(self._methods)
 
     @property
     def classes(self):
@@ -784,47 +2459,225 @@ class FileDoc(object):
         Returns a generator of all classes in the file, in textual order.
 
         >>> file = FileDoc('class.js', read_file('examples/class.js'))
-        >>> cls = file.classes.next()
+        >>> cls = next(file.classes)
         >>> cls.name
         'MyClass'
         >>> cls.methods[0].name
         'first_method'
 
         """
-        return self._filtered_iter(lambda c: isinstance(c, ClassDoc))
+        return iter(self._classes)
 
     def to_dict(self):
         return [comment.to_dict() for comment in self]
 
     def to_html(self, codebase):
-        if codebase.include_private:
-            def visible(fns): return fns
-        else:
-            def visible(fns): 
-                return [fn for fn in fns if not fn.is_private]
-
-        vars = [
-            ('module', self.module.to_html(codebase)),
-            ('function_index', make_index('functions', visible(self.functions))),
-            ('class_index', make_index('classes', self.classes)),
-            ('functions', '\n'.join(fn.to_html(codebase) 
-                                    for fn in visible(self.functions))),
-            ('classes', '\n'.join(cls.to_html(codebase) for cls in self.classes))
-        ]
-        html = '<h1>Module documentation for %s</h1>\n%s' % (self.name, 
-                htmlize_paragraphs(codebase.translate_links(self.module.doc)))
-        for key, html_text in vars:
-            if html_text:
-                html += '<h2>%s</h2>\n%s' % (printable(key), html_text)
-        return html
+        return render_html(self.write_html, codebase)
+
+    def write_html(self, out, codebase):
+        """
+        Write the body of this file's documentation page to `out`, any object
+        with a `write` method, a fragment at a time.  Only the module block
+        is built as a whole string.
+        """
+        templates = codebase.templates
+        functions = [fn for fn in self.functions
+                     if codebase.include_private or not fn.is_private]
+        classes = list(self.classes)
+        module_html = self.module.to_html(codebase)
+        def write_sections(out):
+            write_section = templates['section'].write
+            if module_html:
+                write_section(out, title=printable('module'), body=module_html)
+            if functions:
+                write_section(out, title=printable('function_index'), body=lambda out:
+                        write_index(out, 'functions', functions, templates))
+            if classes:
+                write_section(out, title=printable('class_index'), body=lambda out:
+                        write_index(out, 'classes', classes, templates))
+            if functions:
+                write_section(out, title=printable('functions'), body=lambda out:
+                        write_html_list(out, functions, codebase))
+            if classes:
+                write_section(out, title=printable('classes'), body=lambda out:
+                        write_html_list(out, classes, codebase))
+
+        templates['file'].write(out, name=self.name,
+                doc=htmlize_paragraphs(codebase.translate_links(self.module.doc)),
+                sections=write_sections)
+
+TAG_SCHEMA_CACHE_SIZE = 4096
+"""
+The most schemas `tag_schema` remembers.  Codebases use far fewer distinct
+tag combinations than this; the limit keeps a long-running process fed
+arbitrary tag sets from growing without bound.
+"""
+
+_tag_schemas = {}
+
+def tag_schema(tag_names):
+    """
+    Return the shared schema for a sequence of tag names: a pair of the
+    interned names as a tuple, and a dictionary from each name to its
+    position.  Comments with the same tags in the same order share one schema.
+
+    >>> tag_schema(['doc', 'param']) is tag_schema(('doc', 'param'))
+    True
+
+    Once `TAG_SCHEMA_CACHE_SIZE` schemas are remembered, the cache starts
+    over; comments built before then keep the schemas they have.
+    """
+    tag_names = tuple(tag_names)
+    try:
+        return _tag_schemas[tag_names]
+    except KeyError:
+        names = tuple(intern(str(name)) for name in tag_names)
+        schema = (names, dict((name, i) for i, name in enumerate(names)))
+        if len(_tag_schemas) >= TAG_SCHEMA_CACHE_SIZE:
+            _tag_schemas.clear()
+        _tag_schemas[tag_names] = schema
+        return schema
+
+def intern_tag_value(value):
+    """
+    Intern `value`, a tag value, or the items of it if it's a list, where
+    they're single words: type names from @type or a bare @return {Type},
+    class names from @extends or @member, parameter names, and the like,
+    which recur throughout a codebase.  Longer text is returned as is.
+
+    >>> name = ''.join(['{Array', 'List}'])
+    >>> intern_tag_value([name, '{Int} count How many.'])[0] is \\
+    ...     intern('{ArrayList}')
+    True
+
+    """
+    if value.__class__ is str:
+        if ' ' in value or '\n' in value:
+            return value
+        return intern(value)
+    elif value.__class__ is list:
+        return [intern_tag_value(item) for item in value]
+    return value
+
+class CompactTags(object):
+    """
+    A memory-efficient, dict-like mapping from tag names to their values,
+    used for `CommentDoc.parsed`.  The tag names live in a schema shared by
+    every comment with the same tags (see `tag_schema`), so each comment only
+    stores a tuple of values.  It keeps the order of the dict it was built
+    from:
+
+    >>> tags = CompactTags({'doc': 'A function.', 'param': ['a', 'b']})
+    >>> tags['param']
+    ['a', 'b']
+    >>> 'return' in tags, tags.get('return', '')
+    (False, '')
+    >>> tags.copy()
+    {'doc': 'A function.', 'param': ['a', 'b']}
+
+    Assigning or deleting a tag replaces the schema and value tuple, rather
+    than changing them in place:
+
+    >>> tags['private'] = ''
+    >>> list(tags.keys())
+    ['doc', 'param', 'private']
+
+    """
+    __slots__ = ('schema', 'tag_values')
+
+    def __init__(self, tags=()):
+        if isinstance(tags, CompactTags):
+            self.schema = tags.schema
+            self.tag_values = tags.tag_values
+            return
+        tags = dict(tags)
+        self.schema = tag_schema(tags)
+        self.tag_values = tuple(intern_tag_value(tags[name])
+                                for name in self.schema[0])
+
+    def __len__(self):
+        return len(self.tag_values)
+
+    def __iter__(self):
+        return iter(self.schema[0])
+
+    def __contains__(self, name):
+        return name in self.schema[1]
+
+    def __getitem__(self, name):
+        return self.tag_values[self.schema[1][name]]
+
+    def get(self, name, default=None):
+        index = self.schema[1].get(name)
+        if index is None:
+            return default
+        return self.tag_values[index]
+
+    def keys(self):
+        return list(self.schema[0])
+
+    def values(self):
+        return list(self.tag_values)
+
+    def items(self):
+        return list(zip(self.schema[0], self.tag_values))
+
+    def copy(self):
+        """
+        Return the tags as an ordinary dict.
+        """
+        return dict(zip(self.schema[0], self.tag_values))
+
+    def __setitem__(self, name, value):
+        tags = self.copy()
+        tags[name] = value
+        self.__init__(tags)
+
+    def __delitem__(self, name):
+        tags = self.copy()
+        del tags[name]
+        self.__init__(tags)
+
+    def __eq__(self, other):
+        if isinstance(other, CompactTags):
+            other = other.copy()
+        return self.copy() == other
+
+    def __ne__(self, other):
+        return not self == other
+
+    __hash__ = None
+
+    def __repr__(self):
+        return 'CompactTags(%r)' % self.copy()
+
+    def __getstate__(self):
+        return self.copy()
+
+    def __setstate__(self, state):
+        self.__init__(state)
 
 class CommentDoc(object):
     """
     Base class for all classes that represent a parsed comment of some sort.
+    The tags are stored in `parsed` as `CompactTags`.
     """
+    __slots__ = ('_parsed',)
+
     def __init__(self, parsed_comment):
         self.parsed = parsed_comment
 
+    def _get_parsed(self):
+        return self._parsed
+
+    def _set_parsed(self, parsed_comment):
+        self._parsed = CompactTags(parsed_comment)
+
+    parsed = property(_get_parsed, _set_parsed, doc="""
+        The tags of the comment, as `CompactTags`.  Anything assigned here
+        is converted.
+        """)
+
     def __str__(self):
         return "Docs for " + self.name
 
@@ -900,6 +2753,7 @@ class ModuleDoc(CommentDoc):
     """
     Represents the top-level fileoverview documentation.
     """
+    __slots__ = ('_all_dependencies',)
 
     @property
     def name(self): 
@@ -936,6 +2790,23 @@ class ModuleDoc(CommentDoc):
         """
         return self.get('version')
 
+    def _get_all_dependencies(self):
+        dependencies = self._all_dependencies
+        if callable(dependencies):
+            dependencies = self._all_dependencies = dependencies()
+        return dependencies
+
+    def _set_all_dependencies(self, dependencies):
+        self._all_dependencies = dependencies
+
+    all_dependencies = property(_get_all_dependencies, _set_all_dependencies,
+            doc="""
+        The transitive dependencies of the module, including itself, in
+        load order.  Only set if the FileDoc was created by a CodeBaseDoc.
+        It may be assigned a no-argument function, which is called to compute
+        the list on first access.
+        """)
+
     @property
     def dependencies(self): 
         """
@@ -974,28 +2845,36 @@ class ModuleDoc(CommentDoc):
         """
         Convert this to HTML.
         """
-        html = ''
+        templates = codebase.templates
+        lines = []
         def build_line(key, include_pred, format_fn):
             val = getattr(self, key)
             if include_pred(val):
-                return '<dt>%s</dt><dd>%s</dd>\n' % (printable(key), format_fn(val))
-            else:
-                return ''
+                lines.append(templates['module_field'].render(
+                        title=printable(key), value=format_fn(val)))
         def build_dependency(val):
-            return ', '.join('<a href = "%s.html">%s</a>' % (trim_js_ext(name), name)
+            return ', '.join(templates['dependency'].render(
+                                url=trim_js_ext(name) + '.html', name=name)
                              for name in val)
         for key in ('author', 'organization', 'version', 'license'):
-            html += build_line(key, lambda val: val, lambda val: val)
-        html += build_line('dependencies', lambda val: val, build_dependency)
-        html += build_line('all_dependencies', lambda val: len(val) > 1, 
-                                                build_dependency)
-        html += codebase.build_see_html(self.see, 'h3')
+            build_line(key, lambda val: val, lambda val: val)
+        build_line('dependencies', lambda val: val, build_dependency)
+        build_line('all_dependencies', lambda val: len(val) > 1, 
+                                       build_dependency)
+        lines.append(codebase.build_see_html(self.see, 'h3'))
         
+        html = ''.join(lines)
         if html:
-            return '<dl class = "module">\n%s\n</dl>\n' % html
+            return templates['module'].render(fields=html)
         else:
             return ''
 
+PARAM_SECTIONS = (('params', 'Params'), ('options', 'Options'),
+                  ('exceptions', 'Exceptions'))
+"""
+The `FunctionDoc` fields listed on its page, with their headings.
+"""
+
 class FunctionDoc(CommentDoc):
     r"""
     Documentation for a single function or method.  Takes a parsed
@@ -1009,12 +2888,37 @@ class FunctionDoc(CommentDoc):
     'The auto-naming can pick up functions defined as fields of an object,\n as is common with classes and the module pattern.'
 
     """
+    __slots__ = ('_derived', '_derived_from')
+
     def __init__(self, parsed_comment):
         super(FunctionDoc, self).__init__(parsed_comment)
+        self._derived_from = None
+
+    def _memoize(self, field, compute):
+        """
+        Return the derived `field`, calling `compute` to build it the first
+        time.  Derived fields are thrown away whenever a tag is assigned or
+        deleted, or `parsed` is replaced, since any of those gives `parsed`
+        a new tuple of values.  Tag values must be treated as immutable:
+        changing a list in `parsed` in place isn't noticed.
+
+        The cached values are shared, so the public properties return
+        copies of them; `_shared_params` returns them as they are.
+        """
+        values = self.parsed.tag_values
+        if self._derived_from is not values:
+            self._derived = {}
+            self._derived_from = values
+        try:
+            return self._derived[field]
+        except KeyError:
+            result = self._derived[field] = compute()
+            return result
     
     @property
     def name(self): 
-        return self.get('guessed_function') or self.get('function')
+        return self.get('guessed_function') or self.get('function') or \
+               self.get('recognized_function')
 
     @property
     def params(self):
@@ -1031,7 +2935,31 @@ class FunctionDoc(CommentDoc):
         >>> fn2.params[2].doc
         'The Options array.'
 
+        Like `options`, `return_val` and `exceptions`, this is computed once
+        and then cached until a tag is assigned.  Each call returns new
+        ParamDocs, so changing them doesn't affect the cache:
+
+        >>> fn2.params[0].type = 'Changed'
+        >>> fn2.params[0].type
+        'JQuery'
+        >>> fn2.parsed['param'] = '{Array} elem The elements.'
+        >>> fn2.params[0].type
+        'Array'
+
+        Tags have to be assigned, rather than changed in place, for the
+        change to be picked up; see `_memoize`.
+
         """
+        return [param.copy() for param in self._shared_params('params')]
+
+    def _shared_params(self, field):
+        """
+        Return the cached `params`, `options` or `exceptions` list, or the
+        `return_val`, without copying.  Don't change what's returned.
+        """
+        return self._memoize(field, getattr(self, '_build_' + field))
+
+    def _build_params(self):
         tag_texts = self.get_as_list('param') + self.get_as_list('argument')
         if self.get('guessed_params') is None:
             return [ParamDoc(text) for text in tag_texts]
@@ -1059,6 +2987,9 @@ class FunctionDoc(CommentDoc):
         'Some other option'
 
         """
+        return [param.copy() for param in self._shared_params('options')]
+
+    def _build_options(self):
         return [ParamDoc(text) for text in self.get_as_list('option')]
 
     @property
@@ -1083,6 +3014,9 @@ class FunctionDoc(CommentDoc):
         'Array<String>'
 
         """
+        return self._shared_params('return_val').copy()
+
+    def _build_return_val(self):
         ret = self.get('return') or self.get('returns')
         type = self.get('type')
         if '{' in ret and '}' in ret:
@@ -1110,6 +3044,9 @@ class FunctionDoc(CommentDoc):
         'String'
 
         """
+        return [param.copy() for param in self._shared_params('exceptions')]
+
+    def _build_exceptions(self):
         def make_param(text):
             if '{' in text and '}' in text:
                 # Make sure param name is blank:
@@ -1163,10 +3100,13 @@ class FunctionDoc(CommentDoc):
         vars = super(FunctionDoc, self).to_dict()
         vars.update({
             'name': self.name,
-            'params': [param.to_dict() for param in self.params],
-            'options': [option.to_dict() for option in self.options],
-            'exceptions': [exc.to_dict() for exc in self.exceptions],
-            'return_val': self.return_val.to_dict(),
+            'params': [param.to_dict()
+                       for param in self._shared_params('params')],
+            'options': [option.to_dict()
+                        for option in self._shared_params('options')],
+            'exceptions': [exc.to_dict()
+                           for exc in self._shared_params('exceptions')],
+            'return_val': self._shared_params('return_val').to_dict(),
             'is_private': self.is_private,
             'is_constructor': self.is_constructor,
             'member': self.member
@@ -1177,23 +3117,41 @@ class FunctionDoc(CommentDoc):
         """
         Convert this `FunctionDoc` to HTML.
         """
-        body = ''
-        for section in ('params', 'options', 'exceptions'):
-            val = getattr(self, section)
-            if val:
-                body += '<h5>%s</h5>\n<dl class = "%s">%s</dl>' % (
-                        printable(section), section, 
-                        '\n'.join(param.to_html() for param in val))
+        return render_html(self.write_html, codebase)
 
-        body += codebase.build_see_html(self.see, 'h5', self)
-        return ('<a name = "%s" />\n<div class = "function">\n' + 
-                '<h4>%s</h4>\n%s\n%s\n</div>\n') % (self.name, self.name, 
-                    htmlize_paragraphs(codebase.translate_links(self.doc, self)), body)
+    def write_html(self, out, codebase):
+        """
+        Write the HTML for this `FunctionDoc` to `out`, with the `method`
+        template if it's a method.  That also anchors it by its class and
+        name, since methods of different classes may share a name.
+        """
+        templates = codebase.templates
+        params = []
+        for section, title in PARAM_SECTIONS:
+            val = self._shared_params(section)
+            if val:
+                params.append(templates['param_list'].render(
+                        title=title, css_class=section,
+                        params='\n'.join([param.to_html('', templates)
+                                          for param in val])))
+
+        doc = htmlize_paragraphs(codebase.translate_links(self.doc, self))
+        see = codebase.build_see_html(self.see, 'h5', self)
+        member = self.member
+        if member:
+            templates['method'].write(out, member=member, name=self.name,
+                    doc=doc, params=''.join(params), see=see)
+        else:
+            templates['function'].write(out, name=self.name, doc=doc,
+                    params=''.join(params), see=see)
 
 class ClassDoc(CommentDoc):
     """
     Documentation for a single class.
     """
+    __slots__ = ('methods', '_all_superclasses', '_methods_by_name',
+                 '_indexed_methods')
+
     def __init__(self, parsed_comment):
         """
         Initialize this object from a parsed comment dictionary.  `add_method`
@@ -1202,11 +3160,14 @@ class ClassDoc(CommentDoc):
         """
         super(ClassDoc, self).__init__(parsed_comment)
         self.methods = []
+        self._methods_by_name = {}
+        self._indexed_methods = 0
         # Methods are added externally with add_method, after construction
 
     @property
     def name(self):
-        return self.get('class') or self.get('constructor')
+        return self.get('class') or self.get('constructor') or \
+               self.get('recognized_class')
 
     @property
     def superclass(self):
@@ -1218,6 +3179,22 @@ class ClassDoc(CommentDoc):
         """
         return self.get('extends') or self.get('base')
 
+    def _get_all_superclasses(self):
+        superclasses = self._all_superclasses
+        if callable(superclasses):
+            superclasses = self._all_superclasses = superclasses()
+        return superclasses
+
+    def _set_all_superclasses(self, superclasses):
+        self._all_superclasses = superclasses
+
+    all_superclasses = property(_get_all_superclasses, _set_all_superclasses,
+            doc="""
+        The list of superclass `ClassDoc` objects, nearest first.  Like
+        `ModuleDoc.all_dependencies`, this may be assigned a function that
+        computes it on first access.
+        """)
+
     @property
     def constructors(self):
         """
@@ -1231,6 +3208,8 @@ class ClassDoc(CommentDoc):
         ClassDoc was constructed from a CodeBaseDoc.
         """
         self.methods.append(method)
+        self._methods_by_name.setdefault(method.name, method)
+        self._indexed_methods += 1
 
     def has_method(self, method_name):
         """
@@ -1241,12 +3220,23 @@ class ClassDoc(CommentDoc):
     def get_method(self, method_name, default=None):
         """
         Returns the contained method of the specified name, or `default` if
-        not found.
+        not found.  If several methods share the name, the first one wins.
+
+        >>> cls = FileDoc('class.js', read_file('examples/class.js'))['MyClass']
+        >>> cls.get_method('first_method').name
+        'first_method'
+        >>> cls.get_method('no_such_method', 'missing')
+        'missing'
+
+        Lookups go through a dictionary kept up to date by `add_method`; it's
+        rebuilt if methods were added to the `methods` list directly.
         """
-        for method in self.methods:
-            if method.name == method_name:
-                return method
-        return default
+        if self._indexed_methods != len(self.methods):
+            self._methods_by_name = {}
+            for method in reversed(self.methods):
+                self._methods_by_name[method.name] = method
+            self._indexed_methods = len(self.methods)
+        return self._methods_by_name.get(method_name, default)
 
     def to_dict(self):
         """
@@ -1269,13 +3259,18 @@ class ClassDoc(CommentDoc):
         Convert this ClassDoc to HTML.  This returns the default long-form
         HTML description that's used when the full docs are built.
         """
-        return ('<a name = "%s" />\n<div class = "jsclass">\n' + 
-                '<h3>%s</h3>\n%s\n<h4>Methods</h4>\n%s</div>') % (
-                self.name, self.name, 
-                htmlize_paragraphs(codebase.translate_links(self.doc, self)) +
-                codebase.build_see_html(self.see, 'h4', self),
-                '\n'.join(method.to_html(codebase) for method in self.methods
-                        if codebase.include_private or not method.is_private))
+        return render_html(self.write_html, codebase)
+
+    def write_html(self, out, codebase):
+        """
+        Write the HTML for this `ClassDoc` to `out`.
+        """
+        methods = [method for method in self.methods
+                   if codebase.include_private or not method.is_private]
+        codebase.templates['class'].write(out, name=self.name,
+                doc=htmlize_paragraphs(codebase.translate_links(self.doc, self)),
+                see=codebase.build_see_html(self.see, 'h4', self),
+                methods=lambda out: write_html_list(out, methods, codebase))
 
 class ParamDoc(object):
     """
@@ -1303,18 +3298,32 @@ class ParamDoc(object):
     >>> param2.doc
     'The first param'
 
+    Types and names are interned, since the same few recur throughout a
+    codebase.
     """
+    __slots__ = ('type', 'name', 'doc')
+
     def __init__(self, text):
         parsed = list(split_delimited('{}', ' ', text))
         if parsed[0].startswith('{') and parsed[0].endswith('}'):
-            self.type = parsed[0][1:-1]
-            self.name = parsed[1]
+            self.type = intern(parsed[0][1:-1])
+            self.name = intern(parsed[1])
             self.doc = ' '.join(parsed[2:])
         else:
             self.type = ''
-            self.name = parsed[0]
+            self.name = intern(parsed[0])
             self.doc = ' '.join(parsed[1:])
 
+    def copy(self):
+        """
+        Return a new `ParamDoc` with the same name, type and doc.
+        """
+        param = ParamDoc.__new__(ParamDoc)
+        param.type = self.type
+        param.name = self.name
+        param.doc = self.doc
+        return param
+
     def to_dict(self):
         """
         Convert this to a dict.  Keys (all strings) are:
@@ -1329,9 +3338,10 @@ class ParamDoc(object):
             'doc': self.doc
         }
 
-    def to_html(self, css_class=''):
+    def to_html(self, css_class='', templates=None):
         """
-        Returns the parameter as a dt/dd pair.
+        Returns the parameter as a dt/dd pair, using the `param` template
+        from `templates` (default: `default_templates()`).
         """
         if self.name and self.type:
             header_text = '%s (%s)' % (self.name, self.type)
@@ -1339,20 +3349,28 @@ class ParamDoc(object):
             header_text = self.type
         else:
             header_text = self.name
-        return '<dt>%s</dt><dd>%s</dd>' % (header_text, self.doc)
+        return (templates or default_templates())['param'].render(
+                header=header_text, doc=self.doc)
 
 ##### DEPENDENCIES #####
 
 class CyclicDependency(Exception):
     """
-    Exception raised if there is a cyclic dependency.
+    Exception raised if there is a cyclic dependency.  `values` lists the
+    files that couldn't be sorted, and `cycles` the actual cycles among them,
+    as per `find_cycles`.
     """
-    def __init__(self, remaining_dependencies):
+    def __init__(self, remaining_dependencies, cycles=()):
         self.values = remaining_dependencies
+        self.cycles = list(cycles)
 
     def __str__(self):
-        return ('The following dependencies result in a cycle: '
-              + ', '.join(self.values))
+        if not self.cycles:
+            return ('The following dependencies result in a cycle: '
+                  + ', '.join(self.values))
+        return 'Cyclic dependencies: ' + '; '.join(
+                ', '.join('%s depends on %s' % edge for edge in edges)
+                for files, edges in self.cycles)
 
 class MissingDependency(Exception):
     """
@@ -1419,7 +3437,11 @@ def topological_sort(dependencies, start_nodes):
     leftover_nodes = [node for node in list(dependencies.keys())
                       if in_degree(node) > 0]
     if leftover_nodes:
-        raise CyclicDependency(leftover_nodes)
+        graph = dict((node, []) for node in dependencies)
+        for node in dependencies:
+            for child in edges(node):
+                graph[child].append(node)
+        raise CyclicDependency(leftover_nodes, find_cycles(graph))
     else:
         return retval
 
@@ -1432,38 +3454,612 @@ def find_dependencies(start_nodes, js_doc):
     """
     return topological_sort(*build_dependency_graph(start_nodes, js_doc))
 
-##### HTML utilities #####
-def build_html_page(title, body):
+def build_full_dependency_graph(js_doc):
     """
-    Build the simple tag skeleton for a title and body.
+    Build the dependency graph for every file in `js_doc` in a single pass.
+    The graph is a dictionary from filename to the tuple of its immediate
+    dependencies.  Raises MissingDependency if any declared dependency isn't
+    in `js_doc`.
+    """
+    graph = {}
+    for file in js_doc:
+        dependencies = tuple(js_doc[file].module.dependencies)
+        for dependency in dependencies:
+            if dependency not in js_doc:
+                raise MissingDependency(file, dependency)
+        graph[file] = dependencies
+    return graph
+
+def split_by_prefix(modules, size, prefix=''):
+    """
+    Split `modules`, a list of `FileDoc`s sorted by name that all start with
+    `prefix`, into a list of (prefix, modules) pairs, using the shortest
+    prefixes that leave at most `size` modules in each.  A module whose
+    name is a prefix of others gets a group of its own.
+
+    >>> [(prefix, [doc.name for doc in docs]) for prefix, docs in
+    ...  split_by_prefix([FileDoc(name, '') for name in
+    ...                   ['a.js', 'ab.js', 'abc.js', 'b.js']], 2)]
+    [('a.', ['a.js']), ('ab', ['ab.js', 'abc.js']), ('b', ['b.js'])]
+
+    """
+    if len(modules) <= size:
+        return [(prefix, modules)]
+    groups = []
+    start = len(prefix)
+    for doc in modules:
+        key = doc.name[:start + 1]
+        if groups and groups[-1][0] == key:
+            groups[-1][1].append(doc)
+        else:
+            groups.append((key, [doc]))
+    return flatten(split_by_prefix(group, size, key)
+                   for key, group in groups)
+
+def strongly_connected_components(graph):
+    """
+    Return the strongly connected components of `graph`, a dictionary from
+    each file to the files it depends on, using Tarjan's algorithm in
+    O(V + E) time without recursion.  Each component is a list of files in
+    the graph's order, and components come after every component they
+    depend on.
+
+    >>> strongly_connected_components({'a.js': ['b.js'], 'b.js': ['a.js'],
+    ...                                'c.js': ['a.js'], 'd.js': []})
+    [['a.js', 'b.js'], ['c.js'], ['d.js']]
+
+    """
+    position = dict((file, i) for i, file in enumerate(graph))
+    index = {}
+    lowlink = {}
+    stack = []
+    on_stack = set()
+    components = []
+    for root in graph:
+        if root in index:
+            continue
+        index[root] = lowlink[root] = len(index)
+        stack.append(root)
+        on_stack.add(root)
+        work = [(root, iter(graph[root]))]
+        while work:
+            node, children = work[-1]
+            for child in children:
+                if child not in index:
+                    index[child] = lowlink[child] = len(index)
+                    stack.append(child)
+                    on_stack.add(child)
+                    work.append((child, iter(graph[child])))
+                    break
+                elif child in on_stack:
+                    lowlink[node] = min(lowlink[node], index[child])
+            else:
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    lowlink[parent] = min(lowlink[parent], lowlink[node])
+                if lowlink[node] == index[node]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        on_stack.discard(member)
+                        component.append(member)
+                        if member == node:
+                            break
+                    component.sort(key=position.__getitem__)
+                    components.append(component)
+    return components
+
+def _is_cycle(component, graph):
+    return len(component) > 1 or component[0] in graph[component[0]]
+
+def _cycle_edges(component, graph):
+    members = set(component)
+    return [(file, dependency) for file in component
+            for dependency in graph[file] if dependency in members]
+
+def find_cycles(graph):
+    """
+    Return every cycle in `graph` (as per `strongly_connected_components`),
+    as a pair of the list of files in the cycle and the list of (file,
+    dependency) edges between them.
+
+    >>> find_cycles({'a.js': ['b.js'], 'b.js': ['a.js'], 'c.js': ['a.js']})
+    [(['a.js', 'b.js'], [('a.js', 'b.js'), ('b.js', 'a.js')])]
+
+    """
+    return [(component, _cycle_edges(component, graph))
+            for component in strongly_connected_components(graph)
+            if _is_cycle(component, graph)]
+
+def _sort_closure(start, graph):
+    """
+    Equivalent to ``find_dependencies([start], js_doc)``, but walking the
+    precomputed `graph` instead of rebuilding it from the `FileDoc`s.  The
+    graph must already be known to be acyclic.
+    """
+    dependents = {start: []}
+    closure = [start]
+    for file in closure:
+        for dependency in graph[file]:
+            if dependency not in dependents:
+                dependents[dependency] = []
+                closure.append(dependency)
+            dependents[dependency].append(file)
+
+    in_degrees = dict((file, len(graph[file])) for file in closure)
+    stack = [file for file in closure if not in_degrees[file]]
+    retval = []
+    while stack:
+        node = stack.pop()
+        retval.append(node)
+        for child in dependents[node]:
+            in_degrees[child] -= 1
+            if not in_degrees[child]:
+                stack.append(child)
+    return retval
+
+def find_all_dependencies(js_doc):
+    """
+    Return a dictionary mapping every file in `js_doc` to the same list that
+    ``find_dependencies([file], js_doc)`` would return.  The graph is built
+    and checked for cycles once for the whole codebase, rather than once per
+    file.
+
+    >>> find_all_dependencies(CodeBaseDoc(['examples']))['subclass.js']
+    ['module.js', 'module_closure.js', 'class.js', 'subclass.js']
+
+    """
+    all_dependencies, cycles, cyclic_files = analyze_dependencies(js_doc)
+    if cycles:
+        raise CyclicDependency(sorted(cyclic_files), cycles)
+    return all_dependencies
+
+def analyze_dependencies(js_doc):
+    r"""
+    Work out the transitive dependencies of every file in `js_doc`, even
+    if there are cycles.  Returns a triple of:
+
+        - a dictionary from each file to its dependencies, in load order,
+          as for `find_all_dependencies`
+        - the list of cycles, as per `find_cycles`
+        - the set of files that are in a cycle or depend on one
+
+    Each file's dependencies are the same as ``find_dependencies([file],
+    js_doc)`` would return, unless it's in or depends on a cycle.  Then the
+    files in each cycle are kept together, in no particular order, after
+    the files they depend on.
+
+    >>> def module(*names):
+    ...     return FileDoc('', '/** A module.\n' + ''.join(
+    ...         ' * @dependency %s\n' % name for name in names) + ' */\n')
+    >>> js_doc = {'a.js': module('b.js'), 'b.js': module('a.js', 'd.js'),
+    ...           'c.js': module('a.js'), 'd.js': module()}
+    >>> all_dependencies, cycles, cyclic_files = analyze_dependencies(js_doc)
+    >>> cycles
+    [(['a.js', 'b.js'], [('a.js', 'b.js'), ('b.js', 'a.js')])]
+    >>> sorted(cyclic_files)
+    ['a.js', 'b.js', 'c.js']
+    >>> all_dependencies['c.js'], all_dependencies['d.js']
+    (['d.js', 'a.js', 'b.js', 'c.js'], ['d.js'])
+
+    """
+    graph = build_full_dependency_graph(js_doc)
+    components = strongly_connected_components(graph)
+    cycles = []
+    cyclic_files = set()
+    position = {}
+    for component in components:
+        if _is_cycle(component, graph):
+            cycles.append((component, _cycle_edges(component, graph)))
+            cyclic_files.update(component)
+        elif any(dependency in cyclic_files
+                 for dependency in graph[component[0]]):
+            cyclic_files.add(component[0])
+        for file in component:
+            position[file] = len(position)
+
+    all_dependencies = {}
+    for file in flatten(components):
+        if file not in cyclic_files:
+            dependencies = graph[file]
+            if len(set(dependencies)) == 1:
+                # A file with a single dependency always sorts right after
+                # that dependency's closure, so reuse its list; this makes
+                # long @dependency chains linear.
+                all_dependencies[file] = \
+                        all_dependencies[dependencies[0]] + [file]
+            else:
+                all_dependencies[file] = _sort_closure(file, graph)
+            continue
+        closure = set([file])
+        queue = [file]
+        for node in queue:
+            for dependency in graph[node]:
+                if dependency not in closure:
+                    closure.add(dependency)
+                    queue.append(dependency)
+        all_dependencies[file] = sorted(closure, key=position.__getitem__)
+    return all_dependencies, cycles, cyclic_files
+
+##### Build manifest #####
+
+MANIFEST_NAME = '.pyjsdoc-manifest.json'
+MANIFEST_VERSION = 1
+"""
+Version of the page signatures stored in the build manifest.  Bump this
+whenever the generated HTML changes, so the next incremental build rewrites
+every page.
+"""
+
+def load_manifest(output_dir):
+    """
+    Return the build manifest saved in `output_dir` by `save_manifest`: a
+    dictionary from page name (relative to `output_dir`) to a signature of
+    the inputs that page was built from.  A missing, unreadable or outdated
+    manifest results in an empty dictionary, so everything gets rebuilt.
+
+    >>> load_manifest('no_such_directory')
+    {}
+
     """
-    return """<html>
+    try:
+        manifest = decode_json(read_file(os.path.join(output_dir, MANIFEST_NAME)))
+    except Exception:
+        return {}
+    if not isinstance(manifest, dict) or \
+            manifest.get('version') != MANIFEST_VERSION:
+        return {}
+    return manifest.get('pages') or {}
+
+def save_manifest(output_dir, pages):
+    """
+    Save the page signature dictionary `pages` as the build manifest for
+    `output_dir`.
+    """
+    save_file_if_changed(os.path.join(output_dir, MANIFEST_NAME), encode_json(
+            {'version': MANIFEST_VERSION, 'pages': pages}))
+
+##### Templates #####
+
+SEARCH_INDEX_VERSION = 1
+"""
+Version of the format of the index returned by `CodeBaseDoc.search_index`.
+"""
+
+SEARCH_KINDS = ['file', 'function', 'class', 'method']
+"""
+The kinds of search index entry, in the order their numbers refer to.
+"""
+
+DEFAULT_TEMPLATES = {
+    'page': '''<html>
     <head>
-        <title>%s</title>
+        <title>{{title}}</title>
         <link rel = "stylesheet" type = "text/css" href = "jsdoc.css" />
     </head>
     <body>
-        %s
+        {{body}}
     </body>
-</html>""" % (title, body)
+</html>''',
+    'module_index': '<h1>Module index</h1>\n'
+                    '<p><a href = "search.html">Search</a></p>\n{{index}}',
+    'index_shard': '<h1>Module index: {{title}}</h1>\n'
+                   '<p><a href = "index.html">All modules</a></p>\n{{index}}',
+    'search': '<h1>Search</h1>\n'
+              '<input type = "text" id = "search-box" />\n'
+              '<ul id = "search-results"></ul>\n'
+              '<script type = "text/javascript" src = "search.js"></script>',
+    'file': '<h1>Module documentation for {{name}}</h1>\n{{doc}}{{sections}}',
+    'section': '<h2>{{title}}</h2>\n{{body}}',
+    'module': '<dl class = "module">\n{{fields}}\n</dl>\n',
+    'module_field': '<dt>{{title}}</dt><dd>{{value}}</dd>\n',
+    'dependency': '<a href = "{{url}}">{{name}}</a>',
+    'function': '<a name = "{{name}}" />\n<div class = "function">\n'
+                '<h4>{{name}}</h4>\n{{doc}}\n{{params}}{{see}}\n</div>\n',
+    'method': '<a name = "{{member}}.{{name}}" />\n'
+              '<a name = "{{name}}" />\n<div class = "function">\n'
+              '<h4>{{name}}</h4>\n{{doc}}\n{{params}}{{see}}\n</div>\n',
+    'param_list': '<h5>{{title}}</h5>\n<dl class = "{{css_class}}">'
+                  '{{params}}</dl>',
+    'param': '<dt>{{header}}</dt><dd>{{doc}}</dd>',
+    'class': '<a name = "{{name}}" />\n<div class = "jsclass">\n'
+             '<h3>{{name}}</h3>\n{{doc}}{{see}}\n<h4>Methods</h4>\n'
+             '{{methods}}</div>',
+    'index': '<dl class = "{{css_class}}">\n{{entries}}\n</dl>',
+    'index_entry': '<dt><a href = "{{url}}">{{name}}</a></dt>\n'
+                   '<dd>{{doc}}</dd>',
+    'see': '<{{tag}}>See Also:</{{tag}}>\n<ul>\n{{items}}</ul>',
+    'see_item': '<li><a href = "{{url}}">{{ref}}</a></li>',
+    'link': '<a href = "{{url}}">{{ref}}</a>'
+}
+"""
+The templates the documentation is built from, by name.  See `Template` for
+the syntax; `load_templates` reads replacements for any of them.
+"""
+
+TEMPLATE_FIELD_REGEXP = re.compile(r'\{\{\s*([A-Za-z]\w*)\s*\}\}')
+
+class Template(object):
+    """
+    An HTML template, compiled into Python functions when it's created.
+    Templates are plain text with ``{{field}}`` placeholders:
+
+    >>> template = Template('<h4>{{name}}</h4>\\n{{doc}}')
+    >>> template.fields
+    ('name', 'doc')
+    >>> template.render(name='f', doc='<p>Docs</p>')
+    '<h4>f</h4>\\n<p>Docs</p>'
+
+    A field's value is either a string, or a function that's called with the
+    output stream to write the field itself, so nested content needn't be
+    built up as a string:
+
+    >>> out = io.StringIO()
+    >>> template.write(out, name='f', doc=lambda out: out.write('<p>Docs</p>'))
+    >>> out.getvalue()
+    '<h4>f</h4>\\n<p>Docs</p>'
+
+    `fields`, if given, is the full list of fields the template is rendered
+    with; the source may use any of them, but no others.
+
+    >>> Template('{{title}}', fields=['name'])
+    Traceback (most recent call last):
+    ...
+    ValueError: Unknown field 'title' in template
+
+    """
+
+    def __init__(self, source, fields=None, name='template'):
+        self.source = source
+        self.name = name
+        used = []
+        parts = []
+        pos = 0
+        for match in TEMPLATE_FIELD_REGEXP.finditer(source):
+            field = match.group(1)
+            if fields is not None and field not in fields:
+                raise ValueError('Unknown field %r in %s' % (field, name))
+            if keyword.iskeyword(field):
+                raise ValueError('Invalid field %r in %s' % (field, name))
+            if field not in used:
+                used.append(field)
+            parts.append((source[pos:match.start()], field))
+            pos = match.end()
+        parts.append((source[pos:], None))
+        if fields is None:
+            fields = used
+        self.fields = tuple(fields)
+        self.write, self.render = self._compile(parts)
+
+    def _compile(self, parts):
+        """
+        Generate the `write` and `render` functions for the template's
+        static fragments and fields, so rendering is a straight sequence of
+        writes with no parsing or dictionary lookups.  When every field is
+        a string, which is the usual case, the whole template is a single
+        %-format.  The generated code only uses names that start with an
+        underscore, which field names can't, so a field may be called
+        anything:
+
+        >>> Template('<b>{{str}}</b>').render(str='v')
+        '<b>v</b>'
+        >>> out = io.StringIO()
+        >>> Template('<b>{{str}}</b>').write(out, str='v')
+        >>> out.getvalue()
+        '<b>v</b>'
+        """
+        params = ['%s=""' % field for field in self.fields]
+        used = [field for field in self.fields
+                if any(field == part_field for literal, part_field in parts)]
+        format_string = ''.join(literal.replace('%', '%%') +
+                                (field and '%s' or '') for literal, field in parts)
+        format_args = ''.join('%s, ' % field for literal, field in parts
+                              if field)
+        all_strings = ' and '.join('%s.__class__ is _str' % field
+                                   for field in used) or 'True'
+        write_lines = []
+        render_items = []
+        for literal, field in parts:
+            if literal:
+                write_lines.append('    _write(%r)' % literal)
+                render_items.append(repr(literal))
+            if field:
+                write_lines.append('    if %s.__class__ is _str: _write(%s)\n'
+                                   '    elif _callable(%s): %s(_out)\n'
+                                   '    else: _write(_str(%s))'
+                                   % ((field,) * 5))
+                render_items.append('%s if %s.__class__ is _str else '
+                                    '_field_text(%s)' % (field, field, field))
+        source = ('def write(%s):\n'
+                  '    if %s:\n'
+                  '        _out.write(%r %% (%s))\n'
+                  '        return\n'
+                  '    _write = _out.write\n%s\n'
+                  'def render(%s):\n'
+                  '    if %s:\n'
+                  '        return %r %% (%s)\n'
+                  '    return "".join((%s,))\n') % (
+                ', '.join(['_out'] + params), all_strings, format_string,
+                format_args, '\n'.join(write_lines),
+                ', '.join(params), all_strings, format_string, format_args,
+                ', '.join(render_items) or '""')
+        namespace = {'_field_text': _field_text, '_str': str,
+                     '_callable': callable}
+        exec(compile(source, '<%s>' % self.name, 'exec'), namespace)
+        return namespace['write'], namespace['render']
+
+def _field_text(value):
+    if callable(value):
+        return render_html(value)
+    return str(value)
+
+class TemplateSet(dict):
+    """
+    The compiled templates for a build: `DEFAULT_TEMPLATES`, with any of them
+    replaced by the sources in the `overrides` dictionary.  Each template is
+    compiled once, here, and the set acts like a dictionary of `Template`
+    objects keyed by name:
+
+    >>> templates = TemplateSet({'link': '<a class = "ref" href = "{{url}}">{{ref}}</a>'})
+    >>> templates['link'].render(url='a.html', ref='a.js')
+    '<a class = "ref" href = "a.html">a.js</a>'
+
+    A replacement can use any of the fields its default template does.
+    """
+
+    def __init__(self, overrides=None):
+        overrides = overrides or {}
+        for name in overrides:
+            if name not in DEFAULT_TEMPLATES:
+                raise ValueError('Unknown template %r' % name)
+        self.sources = dict(DEFAULT_TEMPLATES, **overrides)
+        for name, default in DEFAULT_TEMPLATES.items():
+            fields = Template(default).fields
+            self[name] = Template(self.sources[name], fields,
+                                  'template %s' % name)
+        self._digest = content_hash(repr(sorted(self.sources.items())))
+
+    def digest(self):
+        """
+        Return a hash of the template sources, for page signatures.
+        """
+        return self._digest
+
+_default_templates = []
+
+def default_templates():
+    """
+    Return the `TemplateSet` for `DEFAULT_TEMPLATES`, compiling it the first
+    time it's needed.
+    """
+    if not _default_templates:
+        _default_templates.append(TemplateSet())
+    return _default_templates[0]
+
+def load_templates(directory):
+    """
+    Return a `TemplateSet` in which each template that has a file named
+    ``<name>.html`` in `directory` is replaced by that file's contents.
+    """
+    overrides = {}
+    for name in DEFAULT_TEMPLATES:
+        path = os.path.join(directory, name + '.html')
+        if os.path.exists(path):
+            overrides[name] = read_file(path)
+    return TemplateSet(overrides)
+
+##### HTML utilities #####
+def load_static_file(name):
+    """
+    Return the contents of one of the files shipped in the static directory,
+    such as the default jsdoc.css stylesheet, or None if it can't be found.
+    """
+    try:
+        import pkg_resources
+        return pkg_resources.resource_string(__name__, 'static/' + name)
+    except (ImportError, IOError):
+        base_dir = os.path.dirname(os.path.realpath(__file__))
+        for path in (os.path.join(base_dir, name),
+                     os.path.join(base_dir, 'static', name)):
+            try:
+                fd = open(path, 'rb')
+                try:
+                    return fd.read()
+                finally:
+                    fd.close()
+            except IOError:
+                pass
+        return None
+
+def load_stylesheet():
+    """
+    Return the contents of the default jsdoc.css stylesheet, or None if it
+    can't be found.
+    """
+    return load_static_file('jsdoc.css')
+
+def render_html(write_html, *args):
+    """
+    Call `write_html` with an in-memory output stream followed by `args`, and
+    return everything it wrote as a string.  The `to_html` methods are built
+    on their streaming `write_html` counterparts this way.
+
+    >>> render_html(write_index, 'functions', [])
+    ''
+
+    """
+    out = io.StringIO()
+    write_html(out, *args)
+    return out.getvalue()
+
+def write_html_list(out, docs, codebase):
+    """
+    Write the HTML for each of `docs` (FunctionDocs or ClassDocs) to `out`,
+    separated by newlines.
+    """
+    for i, doc in enumerate(docs):
+        if i:
+            out.write('\n')
+        doc.write_html(out, codebase)
+
+def write_html_page(out, title, write_body, templates=None):
+    """
+    Write the simple tag skeleton for a page to `out` with the `page`
+    template from `templates` (default: `default_templates()`), calling
+    `write_body(out)` to fill in the body.
+
+    >>> out = io.StringIO()
+    >>> write_html_page(out, 'Title', lambda out: out.write('Body'))
+    >>> out.getvalue() == build_html_page('Title', 'Body')
+    True
+
+    """
+    (templates or default_templates())['page'].write(out, title=title,
+                                                     body=write_body)
+
+def build_html_page(title, body):
+    """
+    Build the simple tag skeleton for a title and body.
+    """
+    return render_html(write_html_page, title, lambda out: out.write(body))
+
+def save_html_page(path, title, write_body, templates=None):
+    """
+    Write a page, as per `write_html_page`, straight to the file at `path`,
+    without building it in memory first.
+    """
+    out = open_output_file(path)
+    try:
+        write_html_page(out, title, write_body, templates)
+    finally:
+        out.close()
+
+def write_index(out, css_class, entities, templates=None):
+    """
+    Write the HTML index (a short description and a link to the full
+    documentation) for a list of FunctionDocs or ClassDocs to `out`, with
+    the `index` and `index_entry` templates from `templates` (default:
+    `default_templates()`).  Nothing is written if the list is empty.
+    """
+    if not entities:
+        return
+    templates = templates or default_templates()
+    write_entry = templates['index_entry'].write
+    def write_entries(out):
+        for i, entity in enumerate(entities):
+            if i:
+                out.write('\n')
+            write_entry(out, name=entity.name, url=entity.url,
+                        doc=first_sentence(entity.doc))
+    templates['index'].write(out, css_class=css_class, entries=write_entries)
 
 def make_index(css_class, entities):
     """
     Generate the HTML index (a short description and a link to the full
     documentation) for a list of FunctionDocs or ClassDocs.
     """
-    def make_entry(entity):
-        return ('<dt><a href = "%(url)s">%(name)s</a></dt>\n' +
-                '<dd>%(doc)s</dd>') % {
-            'name': entity.name,
-            'url': entity.url,
-            'doc': first_sentence(entity.doc)
-        }
-    entry_text = '\n'.join(make_entry(val) for val in entities)
-    if entry_text:
-        return '<dl class = "%s">\n%s\n</dl>' % (css_class, entry_text)
-    else:
-        return ''
+    return render_html(write_index, css_class, list(entities))
 
 def first_sentence(str):
     """
@@ -1509,17 +4105,41 @@ def usage():
 Usage: %(name)s [options] file1.js file2.js ...
 
 By default, this tool recursively searches the current directory for .js files
-to build up its dependency database.  This can be changed with the --jspath option (see below).  It then outputs the JSDoc for the files on the command-line (if no files are listed, it generates the docs for the whole sourcebase).  If only a single file is listed and no output directory is specified, the HTML page is placed in the current directory; otherwise, all pages and a module index are placed in the output directory.
+to build up its dependency database.  This can be changed with the --jspath option (see below).  It then outputs the JSDoc for the files on the command-line (if no files are listed, it generates the docs for the whole sourcebase).  If only a single file is listed and no output directory is specified, the HTML page is placed in the current directory; otherwise, all pages, a module index and a search page are placed in the output directory.
 
 Available options:
 
   -p, --jspath  Directory to search for JS libraries (multiple allowed)
   -o, --output  Output directory for building full documentation (default: apidocs)
   --private     Include private functions & methods in output
+  --templates   Directory of templates (named like page.html, function.html)
+                that replace the built-in ones used for the HTML
+  --cache       Directory for caching parsed files between runs
+  --incremental Only rebuild pages whose inputs changed since the last build
+  --index-shards  Split the module index into one page per 'directory', or
+                into pages of at most this many modules sharing a name
+                prefix, linked from index.html
+  --watch       After building, keep watching for changed files and rebuild
+                the affected pages
+  -w, --workers Number of processes to parse files and render pages with
+                (default: 1).  Reports per-worker rendering throughput.
+                Pages are only rendered in parallel where Python forks
+                processes by default, such as Linux.
+  --timings     Write a JSON report of how long each phase took, the slowest
+                files to parse and render, and reference lookup counts to
+                this file
   --help        Print usage information and exit
   --test        Run PyJSDoc unit tests
   -j, --json    Output doc parse tree in JSON instead of building HTML
-  -d, --dependencies    Output dependencies for file(s) only
+  --ndjson      Output the doc parse tree as newline-delimited JSON, with one
+                record per 'file' or per 'comment'
+  -d, --dependencies    Output dependencies for file(s) only.  This is
+                fastest when each file starts with its @fileoverview block
+  --dependents  Output the file(s) and everything that depends on them
+  --bundle      Concatenate the file(s) and their dependencies, in dependency
+                order, into this file
+  --bundle-map  With --bundle, write a JSON list of the offset and length of
+                each file in the bundle to this file
 
 Cookbook of common tasks:
 
@@ -1528,9 +4148,14 @@ Cookbook of common tasks:
 
   $ %(name)s -d -p trunk/plugins jquery.dimensions.js
 
+  List the modules affected by a change to jquery.js, for example to rerun
+  only their tests:
+
+  $ %(name)s --dependents -p trunk/plugins jquery.js
+
   Concatenate dependent plugins into a single file for web page:
 
-  $ %(name)s -d rootfile1.js rootfile2.js | xargs cat > scripts.js
+  $ %(name)s --bundle scripts.js rootfile1.js rootfile2.js
 
   Read documentation information for form plugin (including full dependencies),
   and include on a PHP web page using the PHP Services_JSON module:
@@ -1556,6 +4181,93 @@ def get_path_list(opts):
             paths.append(arg)
     return paths or [os.getcwd()]
 
+WATCH_INTERVAL = 0.1
+"""
+Seconds between polls of the filesystem in --watch mode.
+"""
+
+def snapshot_js_files(paths):
+    """
+    Return a dictionary from the path of every JS file under the root
+    `paths` to its (size, modification time), for detecting changes.
+    """
+    snapshot = {}
+    for path in get_file_list(paths):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        snapshot[path] = (stat.st_size,
+                          getattr(stat, 'st_mtime_ns', stat.st_mtime))
+    return snapshot
+
+def watch_and_rebuild(docs, files, output_dir, interval=WATCH_INTERVAL,
+                      index_shards=None):
+    """
+    Poll the JS files under `docs.root_paths` every `interval` seconds,
+    and whenever any are changed, added or removed, reload them into `docs`
+    and incrementally rebuild the pages for `files` (all if None) in
+    `output_dir`, with the module index split as per `index_shards`.
+    Runs until interrupted.
+    """
+    snapshot = snapshot_js_files(docs.root_paths)
+    while True:
+        time.sleep(interval)
+        current = snapshot_js_files(docs.root_paths)
+        changed = [path for path, stat in current.items()
+                   if snapshot.get(path) != stat]
+        deleted = [path for path in snapshot if path not in current]
+        snapshot = current
+        if not changed and not deleted:
+            continue
+
+        start = time.time()
+        try:
+            docs.reload_files(changed, deleted)
+            docs.save_docs(files, output_dir, True, index_shards=index_shards)
+        except (MissingDependency, CyclicDependency):
+            warn('%s', sys.exc_info()[1])
+            continue
+        warn('Updated docs for %d changed and %d deleted files in %d ms',
+             len(changed), len(deleted), (time.time() - start) * 1000)
+
+def choose_codebase_class(opts, args):
+    r"""
+    Return the `CodeBaseDoc` class that reads no more than the command line
+    options (in dict form) and file arguments need.  Dependency queries
+    only need module headers, unless JSON output, which includes every
+    comment, is asked for too:
+
+    >>> choose_codebase_class({'-d': ''}, ['class.js']).__name__
+    'DependencyCodeBaseDoc'
+    >>> choose_codebase_class({'-d': '', '-j': ''}, ['class.js']).__name__
+    'LazyCodeBaseDoc'
+
+    So -j gives the same output with or without -d:
+
+    >>> import contextlib
+    >>> def run(*args):
+    ...     out = io.StringIO()
+    ...     try:
+    ...         with contextlib.redirect_stdout(out):
+    ...             main(['pyjsdoc', '-p', 'examples'] + list(args))
+    ...     except SystemExit:
+    ...         pass
+    ...     return out.getvalue()
+    >>> run('-j', 'subclass.js') == run('-j', '-d', 'subclass.js')
+    True
+
+    """
+    json_output = '--json' in opts or '-j' in opts or '--ndjson' in opts
+    if not json_output and ('--dependencies' in opts or '-d' in opts or
+            '--dependents' in opts or '--bundle' in opts):
+        return DependencyCodeBaseDoc
+    elif args and '--watch' not in opts:
+        # Only the listed files and what they depend on need parsing.
+        return LazyCodeBaseDoc
+    else:
+        return CodeBaseDoc
+
 def run_and_exit_if(opts, action, *names):
     """
     Run the no-arg function `action` if any of `names` appears in the
@@ -1575,9 +4287,11 @@ def main(args=sys.argv):
     Main command-line invocation.
     """
     try:
-        opts, args = getopt.gnu_getopt(args[1:], 'p:o:jdt', [
+        opts, args = getopt.gnu_getopt(args[1:], 'p:o:jdtw:', [
             'jspath=', 'output=', 'private', 'json', 'dependencies', 
-            'test', 'help'])
+            'cache=', 'incremental', 'workers=', 'watch', 'ndjson=',
+            'timings=', 'dependents', 'bundle=', 'bundle-map=', 'templates=',
+            'index-shards=', 'test', 'help'])
         opts = dict(opts)
     except getopt.GetoptError:
         usage()
@@ -1587,25 +4301,84 @@ def main(args=sys.argv):
     run_and_exit_if(opts, usage, '--help')
 
     js_paths = get_path_list(opts)
-    docs = CodeBaseDoc(js_paths, '--private' in opts)
-    if args:
-        selected_files = set(docs.keys()) & set(args)
-    else:
-        selected_files = list(docs.keys())
-
-    def print_json():
-        print(docs.to_json(selected_files))
-    run_and_exit_if(opts, print_json, '--json', '-j')
-
-    def print_dependencies():
-        for dependency in find_dependencies(selected_files, docs):
-            print(dependency)
-    run_and_exit_if(opts, print_dependencies, '--dependencies', '-d')
-
-    output = opts.get('--output') or opts.get('-o')
-    if output is None and len(args) != 1:
-        output = 'apidocs'
-    docs.save_docs(selected_files, output)
+    workers = opts.get('--workers') or opts.get('-w') or '1'
+    if not workers.isdigit() or int(workers) < 1:
+        usage()
+        sys.exit(2)
+    workers = int(workers)
+    if opts.get('--ndjson', 'file') not in ('file', 'comment'):
+        usage()
+        sys.exit(2)
+    index_shards = opts.get('--index-shards')
+    if index_shards not in (None, 'directory'):
+        if not index_shards.isdigit() or int(index_shards) < 1:
+            usage()
+            sys.exit(2)
+        index_shards = int(index_shards)
+    codebase_class = choose_codebase_class(opts, args)
+    timings = '--timings' in opts and BuildTimings() or None
+    templates = '--templates' in opts and \
+            load_templates(opts['--templates']) or None
+    docs = codebase_class(js_paths, '--private' in opts, opts.get('--cache'),
+                          workers, timings, templates)
+    try:
+        if args:
+            selected_files = set(docs.keys()) & set(args)
+            if len(selected_files) < len(set(args)) and ('--dependencies' in
+                    opts or '-d' in opts or '--dependents' in opts or
+                    '--bundle' in opts):
+                for name in sorted(set(args) - selected_files):
+                    warn('File %s does not exist', name)
+                usage()
+                sys.exit(2)
+        else:
+            selected_files = list(docs.keys())
+
+        def print_json():
+            docs.write_json(sys.stdout, selected_files)
+            sys.stdout.write('\n')
+        run_and_exit_if(opts, print_json, '--json', '-j')
+
+        def print_ndjson():
+            docs.write_json(sys.stdout, selected_files, opts['--ndjson'])
+        run_and_exit_if(opts, print_ndjson, '--ndjson')
+
+        def print_dependencies():
+            for dependency in docs.load_order(selected_files):
+                print(dependency)
+        run_and_exit_if(opts, print_dependencies, '--dependencies', '-d')
+
+        def print_dependents():
+            for dependent in docs.dependents_of(selected_files):
+                print(dependent)
+        run_and_exit_if(opts, print_dependents, '--dependents')
+
+        def write_bundle():
+            docs.write_bundle(selected_files, opts['--bundle'],
+                              opts.get('--bundle-map'))
+        run_and_exit_if(opts, write_bundle, '--bundle')
+
+        output = opts.get('--output') or opts.get('-o')
+        if output is None and len(args) != 1:
+            output = 'apidocs'
+        docs.save_docs(selected_files if args else None, output,
+                       '--incremental' in opts or '--watch' in opts,
+                       index_shards=index_shards)
+        if workers > 1:
+            for stat in docs.render_stats:
+                warn('Worker %d: %d pages in %.2fs (%.1f pages/s)',
+                     stat['worker'], stat['pages'], stat['seconds'],
+                     stat['pages'] / max(stat['seconds'], 1e-6))
+
+        if '--watch' in opts:
+            try:
+                watch_and_rebuild(docs, selected_files if args else None,
+                                  output, index_shards=index_shards)
+            except KeyboardInterrupt:
+                pass
+    finally:
+        if timings is not None:
+            save_file(opts['--timings'], timings.to_json())
 
 if __name__ == '__main__':
     main()
@@ -6,6 +6,7 @@ setup(
     version='0.9.0',
     py_modules=['pyjsdoc'],
     packages=['static'],
+    package_data={'static': ['*.css', '*.js']},
     include_package_data=True,
     zip_safe=True,
 
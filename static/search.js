@@ -0,0 +1,104 @@
+/**
+ * Client-side search for PyJSDoc documentation.  The index in
+ * search_index.js is only loaded once the search box is used.  Its entries
+ * are sorted by lowercased name, so prefix matches are found by binary
+ * search; other matches come from a scan of the full names.
+ */
+(function() {
+    var MAX_RESULTS = 50;
+    var box = document.getElementById('search-box');
+    var results = document.getElementById('search-results');
+    var index = null;
+    var loading = false;
+    var keys = [];
+
+    window.pyjsdocSearchIndex = function(data) {
+        index = data;
+        for (var i = 0; i < data.entries.length; i++) {
+            var entry = data.entries[i];
+            keys.push(entry[0].toLowerCase());
+        }
+        search();
+    };
+
+    function load() {
+        if (loading) {
+            return;
+        }
+        loading = true;
+        var script = document.createElement('script');
+        script.src = 'search_index.js';
+        document.body.appendChild(script);
+    }
+
+    function lowerBound(query) {
+        var low = 0, high = keys.length;
+        while (low < high) {
+            var mid = (low + high) >> 1;
+            if (keys[mid] < query) {
+                low = mid + 1;
+            } else {
+                high = mid;
+            }
+        }
+        return low;
+    }
+
+    function fullName(entry) {
+        return entry[3] ? entry[3] + '.' + entry[0] : entry[0];
+    }
+
+    function find(query) {
+        var found = [], seen = {};
+        for (var i = lowerBound(query); i < keys.length &&
+                keys[i].slice(0, query.length) === query &&
+                found.length < MAX_RESULTS; i++) {
+            found.push(i);
+            seen[i] = true;
+        }
+        for (var j = 0; j < keys.length && found.length < MAX_RESULTS; j++) {
+            if (!seen[j] && fullName(index.entries[j]).toLowerCase()
+                    .indexOf(query) !== -1) {
+                found.push(j);
+            }
+        }
+        return found;
+    }
+
+    function show(i) {
+        var entry = index.entries[i];
+        var kind = index.kinds[entry[1]];
+        // Methods are anchored by class and name, as names may be shared.
+        var anchor = kind === 'file' ? '' : '#' + fullName(entry);
+        var url = index.files[entry[2]] + anchor;
+        var item = document.createElement('li');
+        var link = document.createElement('a');
+        link.href = url;
+        link.appendChild(document.createTextNode(fullName(entry)));
+        item.appendChild(link);
+        item.appendChild(document.createTextNode(' (' + kind + ') ' + entry[4]));
+        results.appendChild(item);
+    }
+
+    function search() {
+        var query = box.value.replace(/^\s+|\s+$/g, '').toLowerCase();
+        if (!index) {
+            if (query) {
+                load();
+            }
+            return;
+        }
+        while (results.firstChild) {
+            results.removeChild(results.firstChild);
+        }
+        if (query) {
+            var found = find(query);
+            for (var i = 0; i < found.length; i++) {
+                show(found[i]);
+            }
+        }
+    }
+
+    box.onfocus = load;
+    box.onkeyup = search;
+})();